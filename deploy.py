@@ -6,21 +6,67 @@ Modular Python version with small, fixable components
 
 import sys
 import os
-import subprocess
+import asyncio
+import hashlib
+import socket
+import time
+from concurrent.futures import ThreadPoolExecutor, wait, ALL_COMPLETED
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
 from modules.config import Config
 from modules.logger import Logger
-from modules.dependencies import check_dependencies
-from modules.directories import setup_directories
-from modules.download import download_ubuntu_image
-from modules.cloudinit import create_cloud_init_iso
-from modules.deploy import deploy_vm_to_esxi
-from modules.configure import configure_vm
-from modules.monitor import wait_for_completion
-from modules.status import show_final_status
 
-def validate_configuration(logger):
+# Pipeline stage modules are imported just before their step runs, so a
+# run aborted by validation never pays for importing the later stages
+
+# Successful validations are cached so unchanged configs skip the validator
+VALIDATION_CACHE_DIR = os.path.expanduser("~/.cache/deploy-esxi/validation")
+VALIDATION_CACHE_TTL = 24 * 60 * 60  # seconds
+VALIDATION_CACHE_MAX_ENTRIES = 16
+
+def validation_cache_key(script_dir, validator_path):
+    """Hash .env contents with the validator and cloud-init script mtimes"""
+    env_path = os.path.join(script_dir, '.env')
+    cloudinit_path = os.path.join(script_dir, 'modules', 'cloudinit.py')
+    
+    env_bytes = b''
+    if os.path.exists(env_path):
+        with open(env_path, 'rb') as f:
+            env_bytes = f.read()
+    
+    mtimes = f"{os.path.getmtime(validator_path)}:{os.path.getmtime(cloudinit_path)}"
+    return hashlib.blake2b(env_bytes + mtimes.encode()).hexdigest()
+
+def is_validation_cached(key):
+    """Check for a fresh cached validation result, refreshing its LRU position"""
+    cache_path = os.path.join(VALIDATION_CACHE_DIR, f"{key}.ok")
+    
+    try:
+        if time.time() - os.path.getmtime(cache_path) > VALIDATION_CACHE_TTL:
+            os.remove(cache_path)
+            return False
+        os.utime(cache_path)
+        return True
+    except OSError:
+        return False
+
+def cache_validation_result(key):
+    """Record a successful validation and evict least recently used entries"""
+    try:
+        os.makedirs(VALIDATION_CACHE_DIR, exist_ok=True)
+        with open(os.path.join(VALIDATION_CACHE_DIR, f"{key}.ok"), 'w'):
+            pass
+        
+        entries = sorted(
+            (entry for entry in os.scandir(VALIDATION_CACHE_DIR) if entry.name.endswith('.ok')),
+            key=lambda entry: entry.stat().st_mtime
+        )
+        for entry in entries[:-VALIDATION_CACHE_MAX_ENTRIES]:
+            os.remove(entry.path)
+    except OSError:
+        pass  # Cache is best-effort
+
+async def validate_configuration(logger):
     """Run pre-deployment validation"""
     logger.info("🔍 Running pre-deployment validation...")
     
@@ -28,29 +74,65 @@ def validate_configuration(logger):
     validator_path = os.path.join(script_dir, 'scripts', 'validator.py')
     
     try:
-        result = subprocess.run([
-            'python3', validator_path, 'config'
-        ], capture_output=True, text=True, timeout=60)
+        cache_key = validation_cache_key(script_dir, validator_path)
+        if is_validation_cached(cache_key):
+            logger.info("✅ Pre-deployment validation PASSED (cached)")
+            return True
+        
+        proc = await asyncio.create_subprocess_exec(
+            'python3', validator_path, 'config',
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE,
+            cwd=script_dir
+        )
         
-        if result.returncode == 0:
+        try:
+            stdout, stderr = await asyncio.wait_for(proc.communicate(), timeout=60)
+        except asyncio.TimeoutError:
+            proc.kill()
+            await proc.wait()
+            logger.error("❌ Validation timed out")
+            return False
+        
+        if proc.returncode == 0:
+            cache_validation_result(cache_key)
             logger.info("✅ Pre-deployment validation PASSED")
             return True
         else:
             logger.error("❌ Pre-deployment validation FAILED")
             logger.error("Configuration issues must be fixed before deployment")
-            if result.stdout:
-                print(result.stdout)
-            if result.stderr:
-                print(result.stderr)
+            if stdout:
+                print(stdout.decode(errors='replace'))
+            if stderr:
+                print(stderr.decode(errors='replace'))
             return False
             
-    except subprocess.TimeoutExpired:
-        logger.error("❌ Validation timed out")
-        return False
     except Exception as e:
         logger.error(f"❌ Validation error: {e}")
         return False
 
+async def resolve_esxi_host(config, logger):
+    """Look up the ESXi host early so later govc/ovftool runs hit a warm resolver cache"""
+    loop = asyncio.get_running_loop()
+    
+    try:
+        await asyncio.wait_for(loop.getaddrinfo(config.esxi_host, 443, type=socket.SOCK_STREAM), timeout=10)
+    except (OSError, asyncio.TimeoutError) as e:
+        logger.warn(f"Could not resolve ESXi host {config.esxi_host}: {e}")
+
+async def run_preflight(config, logger):
+    """Validate configuration while directories are being set up"""
+    from modules.directories import setup_directories
+    
+    loop = asyncio.get_running_loop()
+    
+    valid, _, _ = await asyncio.gather(
+        validate_configuration(logger),
+        loop.run_in_executor(None, setup_directories, config, logger),
+        resolve_esxi_host(config, logger)
+    )
+    return valid
+
 def main():
     """Main deployment function"""
     logger = Logger()
@@ -59,34 +141,52 @@ def main():
     try:
         logger.info("🚀 Starting Ubuntu VM deployment to ESXi...")
         
-        # Step 0: Validate configuration
-        if not validate_configuration(logger):
+        # Steps 0-1: Validate configuration and setup directories
+        # (download and cloud-init write into work_dir)
+        if not asyncio.run(run_preflight(config, logger)):
             logger.error("Deployment aborted due to validation failures")
             sys.exit(1)
         
-        # Step 1: Check dependencies
+        # Step 2: Check dependencies first - a missing tool exits here in
+        # seconds rather than after the image download
+        from modules.dependencies import check_dependencies
         check_dependencies(config, logger)
         
-        # Step 2: Setup directories
-        setup_directories(config, logger)
+        # Steps 3-4: Download Ubuntu image and create cloud-init ISO
+        # concurrently - neither depends on the other's output
+        from modules.download import download_ubuntu_image
+        from modules.cloudinit import create_cloud_init_iso
         
-        # Step 3: Download Ubuntu image
-        download_ubuntu_image(config, logger)
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            futures = [
+                executor.submit(download_ubuntu_image, config, logger),
+                executor.submit(create_cloud_init_iso, config, logger),
+            ]
+            wait(futures, return_when=ALL_COMPLETED)
         
-        # Step 4: Create cloud-init ISO
-        create_cloud_init_iso(config, logger)
+        # Re-raise the first failure so the deployment still aborts
+        for future in futures:
+            future.result()
         
         # Step 5: Deploy VM
+        from modules.deploy import deploy_vm_to_esxi
         vm_name = deploy_vm_to_esxi(config, logger)
         config.vm_name = vm_name
         
         # Step 6: Configure VM
-        configure_vm(config, logger)
+        from modules.configure import configure_vm
+        # Only an explicit 0 skips the resize; a size that doesn't parse
+        # still goes to govc, which warns and lets the deployment continue
+        disk_size = config.vm_disk_size.strip()
+        expand_disk = not (disk_size.isdigit() and int(disk_size) == 0)
+        configure_vm(config, logger, expand_disk=expand_disk)
         
         # Step 7: Wait for completion
+        from modules.monitor import wait_for_completion
         wait_for_completion(config, logger)
         
         # Step 8: Show final status
+        from modules.status import show_final_status
         show_final_status(config, logger)
         
     except Exception as e:
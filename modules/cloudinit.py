@@ -1,9 +1,292 @@
 """Create cloud-init ISO with FIXED configuration for security testing"""
 
+import copy
+import io
 import os
 import subprocess
 import shutil
 
+import yaml
+
+try:
+    from yaml import CSafeDumper as _SafeDumper
+except ImportError:
+    from yaml import SafeDumper as _SafeDumper
+
+class _LiteralStr(str):
+    """Multi-line string emitted as a YAML literal block (|)"""
+
+class _UserDataDumper(_SafeDumper):
+    """Safe dumper that keeps embedded scripts readable as literal blocks"""
+
+_UserDataDumper.add_representer(
+    _LiteralStr,
+    lambda dumper, data: dumper.represent_scalar('tag:yaml.org,2002:str', str(data), style='|')
+)
+
+# Force network configuration with proper permissions
+_NETPLAN_CONFIG = """network:
+  version: 2
+  ethernets:
+    ens160:
+      dhcp4: true
+      dhcp4-overrides:
+        use-hostname: false
+    ens192:
+      dhcp4: true
+      dhcp4-overrides:
+        use-hostname: false
+"""
+
+_INSTALL_DOCKER_SCRIPT = """#!/bin/bash
+set -e
+
+echo "Installing Docker with error handling..."
+
+# Check internet connectivity first
+if ! ping -c 1 8.8.8.8 > /dev/null 2>&1; then
+    echo "Warning: No internet connectivity, Docker installation may fail"
+    exit 1
+fi
+
+# Add Docker's official GPG key and repository
+apt-get update
+apt-get install -y ca-certificates curl gnupg lsb-release
+
+# Create keyring directory
+mkdir -p /etc/apt/keyrings
+
+# Add Docker GPG key
+curl -fsSL https://download.docker.com/linux/ubuntu/gpg | gpg --dearmor -o /etc/apt/keyrings/docker.gpg
+chmod a+r /etc/apt/keyrings/docker.gpg
+
+# Add Docker repository
+echo "deb [arch=$(dpkg --print-architecture) signed-by=/etc/apt/keyrings/docker.gpg] https://download.docker.com/linux/ubuntu $(lsb_release -cs) stable" | tee /etc/apt/sources.list.d/docker.list > /dev/null
+
+# Update and install Docker
+apt-get update
+apt-get install -y docker-ce docker-ce-cli containerd.io docker-buildx-plugin docker-compose-plugin
+
+# Start and enable Docker
+systemctl enable docker
+systemctl start docker
+
+# Add ubuntu user to docker group
+usermod -aG docker ubuntu
+
+# Test Docker installation
+docker --version
+systemctl is-active docker
+
+echo "Docker installation completed successfully"
+"""
+
+# Fix network configuration with proper error handling
+_NETWORK_SETUP_SCRIPT = """set +e  # Don't exit on errors for network commands
+echo "Configuring network..."
+netplan generate
+netplan apply
+# Try different network restart methods
+systemctl restart systemd-networkd || true
+systemctl restart NetworkManager || true
+# Legacy networking service (may not exist)
+systemctl restart networking || echo "networking.service not found (this is normal on newer systems)"
+echo "Network configuration completed"
+"""
+
+# Install Docker with better error handling
+_DOCKER_SETUP_SCRIPT = """set -e
+echo "Starting Docker installation..."
+if ping -c 1 8.8.8.8 > /dev/null 2>&1; then
+    /home/ubuntu/install-docker.sh
+    echo "Docker installation successful"
+else
+    echo "ERROR: No internet connectivity - Docker installation skipped"
+    echo "Manual installation required after network is fixed"
+fi
+"""
+
+# Install Go with error handling ({go_version} is filled per deployment)
+_GO_SETUP_SCRIPT = """set -e
+echo "Installing Go {go_version}..."
+if ping -c 1 golang.org > /dev/null 2>&1; then
+    cd /tmp
+    wget -q https://golang.org/dl/go{go_version}.linux-amd64.tar.gz
+    tar -xzf go{go_version}.linux-amd64.tar.gz -C /usr/local
+    rm go{go_version}.linux-amd64.tar.gz
+    echo "Go installation successful"
+else
+    echo "ERROR: Cannot reach golang.org - Go installation skipped"
+fi
+"""
+
+# Create improved rootless Docker setup script
+_ROOTLESS_DOCKER_SCRIPT = """cat > /home/ubuntu/setup-docker-rootless.sh << 'EOF'
+#!/bin/bash
+set -e
+
+echo "Setting up Docker rootless mode..."
+
+# Ensure we're running as ubuntu user
+if [ "$(whoami)" != "ubuntu" ]; then
+    echo "Error: This script must be run as the ubuntu user"
+    echo "Usage: sudo -u ubuntu ./setup-docker-rootless.sh"
+    exit 1
+fi
+
+# Check if Docker is installed
+if ! command -v docker > /dev/null 2>&1; then
+    echo "Error: Docker is not installed. Please install Docker first."
+    exit 1
+fi
+
+# Install prerequisites for rootless mode
+sudo apt-get update
+sudo apt-get install -y uidmap dbus-user-session slirp4netns fuse-overlayfs
+
+# Enable unprivileged user namespaces
+echo 'kernel.unprivileged_userns_clone=1' | sudo tee -a /etc/sysctl.conf
+sudo sysctl -p
+
+# Enable lingering for ubuntu user
+sudo loginctl enable-linger ubuntu
+
+# Set up environment
+export XDG_RUNTIME_DIR="/run/user/$(id -u)"
+export DOCKER_HOST="unix://$XDG_RUNTIME_DIR/docker.sock"
+
+# Ensure XDG_RUNTIME_DIR exists
+mkdir -p "$XDG_RUNTIME_DIR"
+
+# Install rootless Docker
+echo "Installing rootless Docker..."
+dockerd-rootless-setuptool.sh install
+
+# Enable and start user systemd service
+systemctl --user enable docker.service
+systemctl --user start docker.service
+
+# Add environment variables to bashrc
+echo "# Docker rootless environment" >> ~/.bashrc
+echo 'export XDG_RUNTIME_DIR="/run/user/$(id -u)"' >> ~/.bashrc
+echo 'export DOCKER_HOST="unix://$XDG_RUNTIME_DIR/docker.sock"' >> ~/.bashrc
+echo 'export PATH="/usr/bin:$PATH"' >> ~/.bashrc
+
+echo "Docker rootless setup complete!"
+echo "Please logout and login again, or run: source ~/.bashrc"
+echo "Then test with: docker ps"
+EOF
+"""
+
+# Create network troubleshooting script
+_FIX_NETWORK_SCRIPT = """cat > /home/ubuntu/fix-network.sh << 'EOF'
+#!/bin/bash
+echo "Network troubleshooting script"
+echo "Current network configuration:"
+ip addr show
+echo ""
+echo "Fixing netplan permissions..."
+sudo chmod 600 /etc/netplan/50-cloud-init.yaml
+echo "Regenerating network configuration..."
+sudo netplan generate
+sudo netplan apply
+echo "Restarting network services..."
+sudo systemctl restart systemd-networkd
+echo "Network fix attempt completed"
+EOF
+"""
+
+# Generate SSH host keys if missing
+_SSH_HOST_KEYS_SCRIPT = """if [ ! -f /etc/ssh/ssh_host_rsa_key ]; then
+    echo "Generating SSH host keys..."
+    ssh-keygen -A
+fi
+"""
+
+# Final network restart with proper error handling
+_FINAL_NETWORK_SCRIPT = """set +e
+echo "Final network configuration..."
+sleep 5
+systemctl restart systemd-networkd || true
+# Force DHCP renewal
+dhclient -r || true
+sleep 2
+dhclient || true
+echo "Network configuration completed"
+"""
+
+# Don't force reboot - let it complete naturally
+_FINAL_MESSAGE = """VM configured with hostname {hostname}!
+Login: ubuntu/ubuntu
+
+Docker installed (if internet was available during setup)
+For rootless Docker mode: ./setup-docker-rootless.sh
+Test Docker: docker ps (after logout/login)
+
+Go {go_version} installed (if internet was available)
+Test Go: go version
+
+Network troubleshooting: ./fix-network.sh
+
+Ready for security testing!
+"""
+
+# Deployment-independent user-data; hostname, SSH key, Go version and the
+# runcmd list are filled in per deployment by create_user_data_forced
+_BASE_USER_DATA = {
+    # User configuration
+    'users': [{
+        'name': 'ubuntu',
+        'sudo': 'ALL=(ALL) NOPASSWD:ALL',
+        'shell': '/bin/bash',
+        'lock_passwd': False,
+        'plain_text_passwd': 'ubuntu',
+    }],
+    # Force password authentication
+    'ssh_pwauth': True,
+    'disable_root': False,
+    'chpasswd': {
+        'expire': False,
+        'users': [{'name': 'ubuntu', 'password': 'ubuntu', 'type': 'text'}],
+    },
+    # FORCE hostname change - multiple methods
+    'hostname': None,
+    'fqdn': None,
+    'preserve_hostname': False,
+    'manage_etc_hosts': True,
+    'write_files': [
+        {
+            'path': '/etc/netplan/50-cloud-init.yaml',
+            'content': _LiteralStr(_NETPLAN_CONFIG),
+            'permissions': '0600',
+            'owner': 'root:root',
+        },
+        {
+            'path': '/etc/hostname',
+            'content': None,
+            'permissions': '0644',
+            'owner': 'root:root',
+        },
+        {
+            'path': '/home/ubuntu/install-docker.sh',
+            'content': _LiteralStr(_INSTALL_DOCKER_SCRIPT),
+            'permissions': '0755',
+            'owner': 'root:root',
+        },
+    ],
+    # Install packages
+    'packages': [
+        'curl', 'wget', 'git', 'vim', 'htop', 'nmap', 'netcat-traditional',
+        'tcpdump', 'python3', 'python3-pip', 'net-tools', 'dnsutils',
+        'apt-transport-https', 'ca-certificates', 'gnupg', 'lsb-release',
+        'software-properties-common', 'cloud-guest-utils',
+    ],
+    # Enable disk expansion
+    'growpart': {'mode': 'auto', 'devices': ['/']},
+    'runcmd': None,
+    'final_message': None,
+}
+
 def create_cloud_init_iso(config, logger):
     """Create cloud-init ISO that FORCES hostname and networking with proper error handling"""
     logger.info("Creating cloud-init configuration with FIXED settings...")
@@ -20,20 +303,17 @@ def create_cloud_init_iso(config, logger):
     # Create user-data with FIXED settings
     user_data_content = create_user_data_forced(config, ssh_key)
     user_data_path = os.path.join(config.work_dir, "user-data")
-    with open(user_data_path, 'w') as f:
-        f.write(user_data_content)
+    write_payload(user_data_path, user_data_content)
     
     # Create meta-data
     meta_data_content = create_meta_data(config)
     meta_data_path = os.path.join(config.work_dir, "meta-data")
-    with open(meta_data_path, 'w') as f:
-        f.write(meta_data_content)
+    write_payload(meta_data_path, meta_data_content)
     
     # Create network-config to force DHCP with proper permissions
     network_config_content = create_network_config()
     network_config_path = os.path.join(config.work_dir, "network-config")
-    with open(network_config_path, 'w') as f:
-        f.write(network_config_content)
+    write_payload(network_config_path, network_config_content)
     
     # Create ISO with all three files
     iso_path = os.path.join(config.work_dir, "cloud-init.iso")
@@ -41,318 +321,71 @@ def create_cloud_init_iso(config, logger):
     
     logger.info(f"✅ Cloud-init ISO created: {iso_path}")
 
+def write_payload(path, content):
+    """Write a cloud-init payload file with one open and a single writev batch"""
+    data = memoryview(content.encode())
+    fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+    try:
+        while data:
+            data = data[os.writev(fd, [data]):]
+    finally:
+        os.close(fd)
+
 def create_user_data_forced(config, ssh_key):
     """Generate cloud-init user-data with FIXED execution and proper error handling"""
-    ssh_keys_section = ""
-    if ssh_key:
-        ssh_keys_section = f"""    ssh_authorized_keys:
-      - {ssh_key}"""
+    hostname = config.vm_hostname
+    go_version = config.go_version
     
-    return f"""#cloud-config
-
-# User configuration
-users:
-  - name: ubuntu
-    sudo: ALL=(ALL) NOPASSWD:ALL
-    shell: /bin/bash
-    lock_passwd: false
-    plain_text_passwd: ubuntu
-{ssh_keys_section}
-
-# Force password authentication
-ssh_pwauth: true
-disable_root: false
-chpasswd:
-  expire: false
-  users:
-    - name: ubuntu
-      password: ubuntu
-      type: text
-
-# FORCE hostname change - multiple methods
-hostname: {config.vm_hostname}
-fqdn: {config.vm_hostname}.local
-preserve_hostname: false
-manage_etc_hosts: true
-
-# Force network configuration with proper permissions
-write_files:
-  - path: /etc/netplan/50-cloud-init.yaml
-    content: |
-      network:
-        version: 2
-        ethernets:
-          ens160:
-            dhcp4: true
-            dhcp4-overrides:
-              use-hostname: false
-          ens192:
-            dhcp4: true
-            dhcp4-overrides:
-              use-hostname: false
-    permissions: '0600'
-    owner: root:root
-  - path: /etc/hostname
-    content: {config.vm_hostname}
-    permissions: '0644'
-    owner: root:root
-  - path: /home/ubuntu/install-docker.sh
-    content: |
-      #!/bin/bash
-      set -e
-      
-      echo "Installing Docker with error handling..."
-      
-      # Check internet connectivity first
-      if ! ping -c 1 8.8.8.8 > /dev/null 2>&1; then
-          echo "Warning: No internet connectivity, Docker installation may fail"
-          exit 1
-      fi
-      
-      # Add Docker's official GPG key and repository
-      apt-get update
-      apt-get install -y ca-certificates curl gnupg lsb-release
-      
-      # Create keyring directory
-      mkdir -p /etc/apt/keyrings
-      
-      # Add Docker GPG key
-      curl -fsSL https://download.docker.com/linux/ubuntu/gpg | gpg --dearmor -o /etc/apt/keyrings/docker.gpg
-      chmod a+r /etc/apt/keyrings/docker.gpg
-      
-      # Add Docker repository
-      echo "deb [arch=$(dpkg --print-architecture) signed-by=/etc/apt/keyrings/docker.gpg] https://download.docker.com/linux/ubuntu $(lsb_release -cs) stable" | tee /etc/apt/sources.list.d/docker.list > /dev/null
-      
-      # Update and install Docker
-      apt-get update
-      apt-get install -y docker-ce docker-ce-cli containerd.io docker-buildx-plugin docker-compose-plugin
-      
-      # Start and enable Docker
-      systemctl enable docker
-      systemctl start docker
-      
-      # Add ubuntu user to docker group
-      usermod -aG docker ubuntu
-      
-      # Test Docker installation
-      docker --version
-      systemctl is-active docker
-      
-      echo "Docker installation completed successfully"
-    permissions: '0755'
-    owner: root:root
-
-# Install packages
-packages:
-  - curl
-  - wget
-  - git
-  - vim
-  - htop
-  - nmap
-  - netcat-traditional
-  - tcpdump
-  - python3
-  - python3-pip
-  - net-tools
-  - dnsutils
-  - apt-transport-https
-  - ca-certificates
-  - gnupg
-  - lsb-release
-  - software-properties-common
-  - cloud-guest-utils
-
-# Enable disk expansion
-growpart:
-  mode: auto
-  devices: ['/']
-
-# FIXED runcmd with proper error handling
-runcmd:
-  # Fix netplan permissions first
-  - chmod 600 /etc/netplan/50-cloud-init.yaml
-  - chown root:root /etc/netplan/50-cloud-init.yaml
-  
-  # FORCE hostname change immediately
-  - hostnamectl set-hostname {config.vm_hostname}
-  - echo "{config.vm_hostname}" > /etc/hostname
-  - sed -i 's/127.0.1.1.*/127.0.1.1 {config.vm_hostname}.local {config.vm_hostname}/' /etc/hosts
-  
-  # FORCE password reset
-  - echo "ubuntu:ubuntu" | chpasswd
-  - usermod -aG sudo ubuntu
-  
-  # FORCE SSH configuration
-  - sed -i 's/#PasswordAuthentication yes/PasswordAuthentication yes/' /etc/ssh/sshd_config
-  - sed -i 's/PasswordAuthentication no/PasswordAuthentication yes/' /etc/ssh/sshd_config
-  - systemctl restart ssh || systemctl restart sshd
-  
-  # Fix network configuration with proper error handling
-  - |
-    set +e  # Don't exit on errors for network commands
-    echo "Configuring network..."
-    netplan generate
-    netplan apply
-    # Try different network restart methods
-    systemctl restart systemd-networkd || true
-    systemctl restart NetworkManager || true
-    # Legacy networking service (may not exist)
-    systemctl restart networking || echo "networking.service not found (this is normal on newer systems)"
-    echo "Network configuration completed"
-  
-  # Wait for network to settle
-  - sleep 10
-  
-  # Install Docker with better error handling
-  - |
-    set -e
-    echo "Starting Docker installation..."
-    if ping -c 1 8.8.8.8 > /dev/null 2>&1; then
-        /home/ubuntu/install-docker.sh
-        echo "Docker installation successful"
-    else
-        echo "ERROR: No internet connectivity - Docker installation skipped"
-        echo "Manual installation required after network is fixed"
-    fi
-  
-  # Install Go {config.go_version} with error handling
-  - |
-    set -e
-    echo "Installing Go {config.go_version}..."
-    if ping -c 1 golang.org > /dev/null 2>&1; then
-        cd /tmp
-        wget -q https://golang.org/dl/go{config.go_version}.linux-amd64.tar.gz
-        tar -xzf go{config.go_version}.linux-amd64.tar.gz -C /usr/local
-        rm go{config.go_version}.linux-amd64.tar.gz
-        echo "Go installation successful"
-    else
-        echo "ERROR: Cannot reach golang.org - Go installation skipped"
-    fi
-  
-  # Set up Go environment
-  - echo 'export PATH=$PATH:/usr/local/go/bin' >> /home/ubuntu/.bashrc
-  - echo 'export PATH=$PATH:/usr/local/go/bin' >> /etc/profile
-  - mkdir -p /home/ubuntu/go/{{bin,src,pkg}}
-  - echo 'export GOPATH=/home/ubuntu/go' >> /home/ubuntu/.bashrc
-  - echo 'export PATH=$PATH:$GOPATH/bin' >> /home/ubuntu/.bashrc
-  - chown -R ubuntu:ubuntu /home/ubuntu/go
-  
-  # Create improved rootless Docker setup script
-  - |
-    cat > /home/ubuntu/setup-docker-rootless.sh << 'EOF'
-    #!/bin/bash
-    set -e
-    
-    echo "Setting up Docker rootless mode..."
-    
-    # Ensure we're running as ubuntu user
-    if [ "$(whoami)" != "ubuntu" ]; then
-        echo "Error: This script must be run as the ubuntu user"
-        echo "Usage: sudo -u ubuntu ./setup-docker-rootless.sh"
-        exit 1
-    fi
-    
-    # Check if Docker is installed
-    if ! command -v docker > /dev/null 2>&1; then
-        echo "Error: Docker is not installed. Please install Docker first."
-        exit 1
-    fi
-    
-    # Install prerequisites for rootless mode
-    sudo apt-get update
-    sudo apt-get install -y uidmap dbus-user-session slirp4netns fuse-overlayfs
-    
-    # Enable unprivileged user namespaces
-    echo 'kernel.unprivileged_userns_clone=1' | sudo tee -a /etc/sysctl.conf
-    sudo sysctl -p
-    
-    # Enable lingering for ubuntu user
-    sudo loginctl enable-linger ubuntu
-    
-    # Set up environment
-    export XDG_RUNTIME_DIR="/run/user/$(id -u)"
-    export DOCKER_HOST="unix://$XDG_RUNTIME_DIR/docker.sock"
-    
-    # Ensure XDG_RUNTIME_DIR exists
-    mkdir -p "$XDG_RUNTIME_DIR"
-    
-    # Install rootless Docker
-    echo "Installing rootless Docker..."
-    dockerd-rootless-setuptool.sh install
-    
-    # Enable and start user systemd service
-    systemctl --user enable docker.service
-    systemctl --user start docker.service
+    doc = copy.deepcopy(_BASE_USER_DATA)
+    if ssh_key:
+        doc['users'][0]['ssh_authorized_keys'] = [ssh_key]
+    doc['hostname'] = hostname
+    doc['fqdn'] = f"{hostname}.local"
+    doc['write_files'][1]['content'] = hostname
     
-    # Add environment variables to bashrc
-    echo "# Docker rootless environment" >> ~/.bashrc
-    echo 'export XDG_RUNTIME_DIR="/run/user/$(id -u)"' >> ~/.bashrc
-    echo 'export DOCKER_HOST="unix://$XDG_RUNTIME_DIR/docker.sock"' >> ~/.bashrc
-    echo 'export PATH="/usr/bin:$PATH"' >> ~/.bashrc
+    # FIXED runcmd with proper error handling
+    doc['runcmd'] = [
+        # Fix netplan permissions first
+        'chmod 600 /etc/netplan/50-cloud-init.yaml',
+        'chown root:root /etc/netplan/50-cloud-init.yaml',
+        # FORCE hostname change immediately
+        f'hostnamectl set-hostname {hostname}',
+        f'echo "{hostname}" > /etc/hostname',
+        f"sed -i 's/127.0.1.1.*/127.0.1.1 {hostname}.local {hostname}/' /etc/hosts",
+        # FORCE password reset
+        'echo "ubuntu:ubuntu" | chpasswd',
+        'usermod -aG sudo ubuntu',
+        # FORCE SSH configuration
+        "sed -i 's/#PasswordAuthentication yes/PasswordAuthentication yes/' /etc/ssh/sshd_config",
+        "sed -i 's/PasswordAuthentication no/PasswordAuthentication yes/' /etc/ssh/sshd_config",
+        'systemctl restart ssh || systemctl restart sshd',
+        _LiteralStr(_NETWORK_SETUP_SCRIPT),
+        # Wait for network to settle
+        'sleep 10',
+        _LiteralStr(_DOCKER_SETUP_SCRIPT),
+        _LiteralStr(_GO_SETUP_SCRIPT.format(go_version=go_version)),
+        # Set up Go environment
+        "echo 'export PATH=$PATH:/usr/local/go/bin' >> /home/ubuntu/.bashrc",
+        "echo 'export PATH=$PATH:/usr/local/go/bin' >> /etc/profile",
+        'mkdir -p /home/ubuntu/go/{bin,src,pkg}',
+        "echo 'export GOPATH=/home/ubuntu/go' >> /home/ubuntu/.bashrc",
+        "echo 'export PATH=$PATH:$GOPATH/bin' >> /home/ubuntu/.bashrc",
+        'chown -R ubuntu:ubuntu /home/ubuntu/go',
+        _LiteralStr(_ROOTLESS_DOCKER_SCRIPT),
+        'chmod +x /home/ubuntu/setup-docker-rootless.sh',
+        'chown ubuntu:ubuntu /home/ubuntu/setup-docker-rootless.sh',
+        _LiteralStr(_FIX_NETWORK_SCRIPT),
+        'chmod +x /home/ubuntu/fix-network.sh',
+        'chown ubuntu:ubuntu /home/ubuntu/fix-network.sh',
+        _LiteralStr(_SSH_HOST_KEYS_SCRIPT),
+        _LiteralStr(_FINAL_NETWORK_SCRIPT),
+    ]
+    doc['final_message'] = _LiteralStr(_FINAL_MESSAGE.format(hostname=hostname, go_version=go_version))
     
-    echo "Docker rootless setup complete!"
-    echo "Please logout and login again, or run: source ~/.bashrc"
-    echo "Then test with: docker ps"
-    EOF
-  - chmod +x /home/ubuntu/setup-docker-rootless.sh
-  - chown ubuntu:ubuntu /home/ubuntu/setup-docker-rootless.sh
-  
-  # Create network troubleshooting script
-  - |
-    cat > /home/ubuntu/fix-network.sh << 'EOF'
-    #!/bin/bash
-    echo "Network troubleshooting script"
-    echo "Current network configuration:"
-    ip addr show
-    echo ""
-    echo "Fixing netplan permissions..."
-    sudo chmod 600 /etc/netplan/50-cloud-init.yaml
-    echo "Regenerating network configuration..."
-    sudo netplan generate
-    sudo netplan apply
-    echo "Restarting network services..."
-    sudo systemctl restart systemd-networkd
-    echo "Network fix attempt completed"
-    EOF
-  - chmod +x /home/ubuntu/fix-network.sh
-  - chown ubuntu:ubuntu /home/ubuntu/fix-network.sh
-  
-  # Generate SSH host keys if missing
-  - |
-    if [ ! -f /etc/ssh/ssh_host_rsa_key ]; then
-        echo "Generating SSH host keys..."
-        ssh-keygen -A
-    fi
-  
-  # Final network restart with proper error handling
-  - |
-    set +e
-    echo "Final network configuration..."
-    sleep 5
-    systemctl restart systemd-networkd || true
-    # Force DHCP renewal
-    dhclient -r || true
-    sleep 2
-    dhclient || true
-    echo "Network configuration completed"
-
-# Don't force reboot - let it complete naturally
-final_message: |
-  VM configured with hostname {config.vm_hostname}!
-  Login: ubuntu/ubuntu
-  
-  Docker installed (if internet was available during setup)
-  For rootless Docker mode: ./setup-docker-rootless.sh
-  Test Docker: docker ps (after logout/login)
-  
-  Go {config.go_version} installed (if internet was available)
-  Test Go: go version
-  
-  Network troubleshooting: ./fix-network.sh
-  
-  Ready for security testing!
-"""
+    return "#cloud-config\n" + yaml.dump(
+        doc, Dumper=_UserDataDumper, default_flow_style=False,
+        sort_keys=False, allow_unicode=True, width=4096
+    )
 
 def create_meta_data(config):
     """Generate cloud-init meta-data"""
@@ -374,8 +407,35 @@ ethernets:
 """
 
 
+# ISO9660 8.3 names paired with the Joliet/Rock Ridge names cloud-init reads
+ISO_FILE_NAMES = {
+    'user-data': '/USERDATA.;1',
+    'meta-data': '/METADATA.;1',
+    'network-config': '/NETCFG.;1',
+}
+
 def create_iso(user_data_path, meta_data_path, network_config_path, iso_path, logger):
-    """Create ISO using available tool with network-config"""
+    """Create ISO in-process with pycdlib, falling back to an external tool"""
+    try:
+        import pycdlib
+    except ImportError:
+        pycdlib = None
+    
+    if pycdlib:
+        logger.info("Creating ISO with pycdlib...")
+        iso = pycdlib.PyCdlib()
+        iso.new(joliet=3, rock_ridge='1.09', vol_ident='cidata')
+        try:
+            for path in (user_data_path, meta_data_path, network_config_path):
+                name = os.path.basename(path)
+                with open(path, 'rb') as f:
+                    content = f.read()
+                iso.add_fp(io.BytesIO(content), len(content), ISO_FILE_NAMES[name],
+                           rr_name=name, joliet_path=f'/{name}')
+            iso.write(iso_path)
+        finally:
+            iso.close()
+        return
     
     if shutil.which('mkisofs'):
         cmd = [
@@ -390,7 +450,7 @@ def create_iso(user_data_path, meta_data_path, network_config_path, iso_path, lo
         ]
         logger.info("Creating ISO with genisoimage...")
     else:
-        raise Exception("No ISO creation tool found (mkisofs or genisoimage)")
+        raise Exception("No ISO creation tool found (pycdlib, mkisofs or genisoimage)")
     
     result = subprocess.run(cmd, capture_output=True, text=True)
     if result.returncode != 0:
@@ -1,9 +1,19 @@
 """Configuration settings for VM deployment with .env support"""
 
+import functools
 import os
+import re
 from datetime import datetime
 
+# KEY=value lines; comments, blank lines and surrounding whitespace are skipped
+_ENV_RE = re.compile(rb'(?m)^[ \t]*(?!#)([A-Za-z_][A-Za-z0-9_]*)[ \t]*=[ \t]*(.*?)[ \t\r]*$')
+
 class Config:
+    # Parsed .env contents keyed by (path, mtime) and discovered SSH keys keyed
+    # by home directory, shared so repeated Config() calls skip the disk
+    _env_cache = {}
+    _ssh_key_cache = {}
+    
     def __init__(self):
         # Load environment variables from .env file
         self._load_env_file()
@@ -16,11 +26,15 @@ class Config:
         if not self.esxi_password:
             raise ValueError("ESXI_PASSWORD not set in .env file")
         
+        # SDK endpoint for govc, built once here rather than per govc env
+        self.govc_url = f"https://{self.esxi_user}:{self.esxi_password}@{self.esxi_host}/sdk"
+        
         # VM specifications from environment
         self.vm_memory = os.getenv('VM_MEMORY', '8192')
         self.vm_cpu = os.getenv('VM_CPU', '8')
         self.vm_disk_size = os.getenv('VM_DISK_SIZE', '500')
         self.datastore = os.getenv('DATASTORE', '12TB')
+        self.datastore_mount = os.path.expanduser(os.getenv('DATASTORE_MOUNT', ''))
         self.go_version = os.getenv('GO_VERSION', '1.24.4')
         
         # VM naming
@@ -37,6 +51,7 @@ class Config:
         # Ubuntu image
         self.ubuntu_base_url = "https://cloud-images.ubuntu.com/oracular/current"
         self.ubuntu_ova = "oracular-server-cloudimg-amd64.ova"
+        self.ubuntu_sha256 = os.getenv('UBUNTU_SHA256', '').strip().lower()
         
         # Tool paths
         self.ovftool_bin = os.path.join(self.tools_dir, "ovftool", "ovftool")
@@ -51,23 +66,43 @@ class Config:
     
     def _load_env_file(self):
         """Load environment variables from .env file"""
-        env_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '.env')
+        env_path = os.path.normpath(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '.env'))
+        
+        try:
+            mtime = os.stat(env_path).st_mtime
+        except OSError:
+            return
         
-        if os.path.exists(env_path):
-            with open(env_path, 'r') as f:
-                for line in f:
-                    line = line.strip()
-                    if line and not line.startswith('#') and '=' in line:
-                        key, value = line.split('=', 1)
-                        os.environ[key.strip()] = value.strip()
+        cache_key = (env_path, mtime)
+        env = Config._env_cache.get(cache_key)
+        if env is None:
+            with open(env_path, 'rb') as f:
+                data = f.read()
+            env = {key.decode(): value.decode() for key, value in _ENV_RE.findall(data)}
+            Config._env_cache[cache_key] = env
+        
+        os.environ.update(env)
     
     def _find_ssh_key(self):
         """Find SSH public key"""
+        home = os.path.expanduser("~")
+        if home in Config._ssh_key_cache:
+            return Config._ssh_key_cache[home]
+        
         keys = [
-            os.path.expanduser("~/.ssh/id_rsa.pub"),
-            os.path.expanduser("~/.ssh/id_ed25519.pub")
+            os.path.join(home, ".ssh", "id_rsa.pub"),
+            os.path.join(home, ".ssh", "id_ed25519.pub")
         ]
+        found = None
         for key in keys:
             if os.path.exists(key):
-                return key
-        return None
+                found = key
+                break
+        
+        Config._ssh_key_cache[home] = found
+        return found
+
+@functools.lru_cache(maxsize=1)
+def get_config():
+    """Config shared by every caller in the process, built on first use"""
+    return Config()
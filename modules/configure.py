@@ -1,86 +1,109 @@
 """Configure VM after deployment"""
 
-import subprocess
 import os
+import re
+import shutil
+from concurrent.futures import ThreadPoolExecutor, as_completed
 
-def configure_vm(config, logger):
+from modules.govc import GovcSession
+
+# device.ls rows: the cloud-init CD-ROM and any hard disk device names
+_CDROM_RE = re.compile(rb'(?m)^(cdrom-\d+)[^\n]*cloud-init\.iso')
+_DISK_RE = re.compile(rb'(?im)^(\S*(?:disk-|harddisk)\S*)')
+
+def configure_vm(config, logger, *, expand_disk=True):
     """Configure VM with cloud-init ISO, connect CD-ROM, and power on"""
     logger.info("Configuring VM and attaching cloud-init...")
     
-    # Set govc environment
-    env = os.environ.copy()
-    env['GOVC_URL'] = f"https://{config.esxi_user}:{config.esxi_password}@{config.esxi_host}/sdk"
-    env['GOVC_INSECURE'] = '1'
+    # One govc session shared by every step
+    session = GovcSession(config)
     
     try:
-        # Expand disk to configured size
-        expand_vm_disk(config, logger, env)
-        
-        # Upload cloud-init ISO
-        upload_cloud_init_iso(config, logger, env)
-        
-        # Add and attach CD-ROM
-        add_cdrom_device(config, logger, env)
-        attach_iso_to_cdrom(config, logger, env)
+        # Upload cloud-init ISO and add the CD-ROM concurrently - the upload
+        # only touches the datastore while the CD-ROM add reconfigures the VM
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            futures = [
+                executor.submit(upload_cloud_init_iso, config, logger, session),
+                executor.submit(add_cdrom_device, config, logger, session),
+            ]
+            for future in as_completed(futures):
+                future.result()
+        
+        # Attach the ISO - this and the remaining steps reconfigure the VM,
+        # so they stay sequential
+        attach_iso_to_cdrom(config, logger, session)
+        
+        # Expand disk to configured size - this also lists the VM devices
+        # once for both disk and CD-ROM discovery
+        if expand_disk:
+            expand_vm_disk(config, logger, session)
         
         # CRITICAL FIX: Connect the CD-ROM device
-        connect_cdrom_device(config, logger, env)
+        connect_cdrom_device(config, logger, session)
         
         # Set boot order to CD-ROM first
-        set_boot_order(config, logger, env)
+        set_boot_order(config, logger, session)
         
         # Power on VM
-        power_on_vm(config, logger, env)
+        power_on_vm(config, logger, session)
         
     except Exception as e:
         logger.error(f"VM configuration failed: {e}")
         raise
 
-def expand_vm_disk(config, logger, env):
+def fetch_device_ls(config, session):
+    """List VM devices once and cache the raw device.ls output on config
+    
+    A failed listing is not cached, so the next caller lists again.
+    """
+    result = session.device_ls(config.vm_name)
+    
+    if result.returncode != 0:
+        return b''
+    config._device_ls_cache = result.stdout_bytes
+    return result.stdout_bytes
+
+def expand_vm_disk(config, logger, session):
     """Expand VM disk to configured size"""
     logger.info(f"Expanding VM disk to {config.vm_disk_size}GB...")
     
     try:
-        # Method 1: Try direct disk expansion by device name
-        cmd = [
-            config.govc_bin, 'vm.disk.change',
-            '-vm', config.vm_name,
-            '-size', f'{config.vm_disk_size}G'
-        ]
-        
-        result = subprocess.run(cmd, env=env, capture_output=True, text=True)
-        
-        if result.returncode == 0:
-            logger.info(f"✅ Disk expanded to {config.vm_disk_size}GB")
-            return
-        else:
-            logger.warn(f"Method 1 failed: {result.stderr}")
-        
-        # Method 2: Try with disk label
-        cmd = [
-            config.govc_bin, 'vm.disk.change',
-            '-vm', config.vm_name,
-            '-disk.label', 'Hard disk 1',
-            '-size', f'{config.vm_disk_size}G'
-        ]
-        
-        result = subprocess.run(cmd, env=env, capture_output=True, text=True)
-        
-        if result.returncode == 0:
-            logger.info(f"✅ Disk expanded to {config.vm_disk_size}GB (method 2)")
-            return
-        else:
-            logger.warn(f"Method 2 failed: {result.stderr}")
-        
-        # Method 3: Try with common disk key
-        cmd = [
-            config.govc_bin, 'vm.disk.change',
-            '-vm', config.vm_name,
-            '-disk.key', '2000',
-            '-size', f'{config.vm_disk_size}G'
-        ]
+        # List devices while method 1 runs so a failure can go straight to
+        # the disk's device name
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            devices_future = None
+            if getattr(config, '_device_ls_cache', None) is None:
+                devices_future = executor.submit(fetch_device_ls, config, session)
+            
+            # Method 1: Try direct disk expansion by device name
+            result = session.disk_change(config.vm_name, config.vm_disk_size)
+            
+            if result.returncode == 0:
+                logger.info(f"✅ Disk expanded to {config.vm_disk_size}GB")
+                return
+            else:
+                logger.warn(f"Method 1 failed: {result.stderr}")
+            
+            devices = devices_future.result() if devices_future else config._device_ls_cache
         
-        result = subprocess.run(cmd, env=env, capture_output=True, text=True)
+        # Method 2: Find the disk in the VM device list
+        if devices:
+            logger.info("VM devices:")
+            logger.info(devices.decode('utf-8', 'replace').rstrip())
+            
+            # Look for disk device in the output
+            for match in _DISK_RE.finditer(devices):
+                device_name = match.group(1).decode()
+                logger.info(f"Trying to expand device: {device_name}")
+                
+                result = session.disk_change(config.vm_name, config.vm_disk_size, '-disk.name', device_name)
+                
+                if result.returncode == 0:
+                    logger.info(f"✅ Disk expanded to {config.vm_disk_size}GB (device: {device_name})")
+                    return
+        
+        # Method 3: Try with disk label
+        result = session.disk_change(config.vm_name, config.vm_disk_size, '-disk.label', 'Hard disk 1')
         
         if result.returncode == 0:
             logger.info(f"✅ Disk expanded to {config.vm_disk_size}GB (method 3)")
@@ -88,33 +111,14 @@ def expand_vm_disk(config, logger, env):
         else:
             logger.warn(f"Method 3 failed: {result.stderr}")
         
-        # Method 4: List devices and try to find disk
-        logger.info("Listing VM devices to find disk...")
-        cmd = [config.govc_bin, 'device.ls', '-vm', config.vm_name]
-        result = subprocess.run(cmd, env=env, capture_output=True, text=True)
+        # Method 4: Try with common disk key
+        result = session.disk_change(config.vm_name, config.vm_disk_size, '-disk.key', '2000')
         
         if result.returncode == 0:
-            logger.info("VM devices:")
-            logger.info(result.stdout)
-            
-            # Look for disk device in the output
-            for line in result.stdout.split('\n'):
-                if 'disk-' in line.lower() or 'harddisk' in line.lower():
-                    device_name = line.split()[0]
-                    logger.info(f"Trying to expand device: {device_name}")
-                    
-                    cmd = [
-                        config.govc_bin, 'vm.disk.change',
-                        '-vm', config.vm_name,
-                        '-disk.name', device_name,
-                        '-size', f'{config.vm_disk_size}G'
-                    ]
-                    
-                    result = subprocess.run(cmd, env=env, capture_output=True, text=True)
-                    
-                    if result.returncode == 0:
-                        logger.info(f"✅ Disk expanded to {config.vm_disk_size}GB (device: {device_name})")
-                        return
+            logger.info(f"✅ Disk expanded to {config.vm_disk_size}GB (method 4)")
+            return
+        else:
+            logger.warn(f"Method 4 failed: {result.stderr}")
         
         # If all methods fail, log error but continue
         logger.error("All disk expansion methods failed")
@@ -125,113 +129,115 @@ def expand_vm_disk(config, logger, env):
         logger.error(f"Error during disk expansion: {e}")
         logger.info("VM will be deployed with original disk size")
 
-def upload_cloud_init_iso(config, logger, env):
+def upload_cloud_init_iso(config, logger, session):
     """Upload cloud-init ISO to datastore"""
     logger.info("Uploading cloud-init ISO...")
     
     iso_local_path = os.path.join(config.work_dir, "cloud-init.iso")
     iso_datastore_path = f"{config.vm_name}/cloud-init.iso"
     
-    cmd = [
-        config.govc_bin, 'datastore.upload',
-        '-ds', config.datastore,
-        iso_local_path, iso_datastore_path
-    ]
+    # Copy straight onto the datastore when it is mounted locally
+    datastore_mount = getattr(config, 'datastore_mount', '')
+    if datastore_mount and os.path.isdir(os.path.join(datastore_mount, config.vm_name)):
+        try:
+            copy_to_datastore_mount(iso_local_path, os.path.join(datastore_mount, iso_datastore_path))
+            logger.info("✅ Cloud-init ISO copied to datastore mount")
+            return
+        except OSError as e:
+            logger.warn(f"Copy to datastore mount failed: {e} - uploading instead")
+    
+    # PUT straight to the datastore endpoint, falling back to govc
+    try:
+        status = session.http_upload(config.datastore, iso_local_path, iso_datastore_path)
+        if status in (200, 201):
+            logger.info("✅ Cloud-init ISO uploaded")
+            return
+        logger.warn(f"Direct ISO upload returned HTTP {status} - retrying with govc")
+    except Exception as e:
+        logger.warn(f"Direct ISO upload failed: {e} - retrying with govc")
     
-    result = subprocess.run(cmd, env=env, capture_output=True, text=True)
+    result = session.upload(config.datastore, iso_local_path, iso_datastore_path)
     if result.returncode != 0:
         raise Exception(f"ISO upload failed: {result.stderr}")
     
     logger.info("✅ Cloud-init ISO uploaded")
 
-def add_cdrom_device(config, logger, env):
+def copy_to_datastore_mount(src_path, dst_path):
+    """Copy a file onto a mounted datastore, letting the kernel move the data"""
+    size = os.path.getsize(src_path)
+    
+    try:
+        with open(src_path, 'rb') as src, open(dst_path, 'wb') as dst:
+            copied = 0
+            while copied < size:
+                count = os.copy_file_range(src.fileno(), dst.fileno(), size - copied)
+                if not count:
+                    break
+                copied += count
+        if copied != size:
+            raise OSError(f"short copy: {copied} of {size} bytes")
+    except (AttributeError, OSError):
+        # No copy_file_range (macOS, Python < 3.8) or not supported across
+        # these filesystems - copyfile still uses sendfile/fcopyfile
+        shutil.copyfile(src_path, dst_path)
+
+def add_cdrom_device(config, logger, session):
     """Add CD-ROM device to VM"""
     logger.info("Adding CD-ROM device...")
     
-    cmd = [
-        config.govc_bin, 'device.cdrom.add',
-        '-vm', config.vm_name
-    ]
-    
-    result = subprocess.run(cmd, env=env, capture_output=True, text=True)
+    result = session.cdrom_add(config.vm_name)
     if result.returncode != 0:
         raise Exception(f"CD-ROM add failed: {result.stderr}")
 
-def attach_iso_to_cdrom(config, logger, env):
+def attach_iso_to_cdrom(config, logger, session):
     """Attach ISO to CD-ROM device"""
     logger.info("Attaching cloud-init ISO to CD-ROM...")
     
     iso_datastore_path = f"{config.vm_name}/cloud-init.iso"
     
-    cmd = [
-        config.govc_bin, 'device.cdrom.insert',
-        '-vm', config.vm_name,
-        '-ds', config.datastore,
-        iso_datastore_path
-    ]
-    
-    result = subprocess.run(cmd, env=env, capture_output=True, text=True)
+    result = session.cdrom_insert(config.vm_name, config.datastore, iso_datastore_path)
     if result.returncode != 0:
         raise Exception(f"ISO attach failed: {result.stderr}")
     
     logger.info("✅ Cloud-init ISO attached")
 
-def power_on_vm(config, logger, env):
+def power_on_vm(config, logger, session):
     """Power on the VM"""
     logger.info("Powering on VM...")
     
-    cmd = [
-        config.govc_bin, 'vm.power',
-        '-on', config.vm_name
-    ]
-    
-    result = subprocess.run(cmd, env=env, capture_output=True, text=True)
+    result = session.power_on(config.vm_name)
     if result.returncode != 0:
         raise Exception(f"Power on failed: {result.stderr}")
     
     logger.info("✅ VM powered on successfully")
 
-def connect_cdrom_device(config, logger, env):
+def connect_cdrom_device(config, logger, session):
     """Connect the CD-ROM device so VM can boot from it"""
     logger.info("Connecting CD-ROM device...")
     
     # First, get the CD-ROM device name
-    cmd = [config.govc_bin, 'device.ls', '-vm', config.vm_name]
-    result = subprocess.run(cmd, env=env, capture_output=True, text=True)
-    
-    cdrom_device = None
-    for line in result.stdout.split('\n'):
-        if 'cdrom-' in line and 'cloud-init.iso' in line:
-            cdrom_device = line.split()[0]
-            break
+    devices = getattr(config, '_device_ls_cache', None)
+    if devices is None:
+        devices = fetch_device_ls(config, session)
     
-    if not cdrom_device:
+    match = _CDROM_RE.search(devices)
+    if not match:
         raise Exception("Could not find cloud-init CD-ROM device")
+    cdrom_device = match.group(1).decode()
     
     # Connect the CD-ROM device
-    cmd = [
-        config.govc_bin, 'device.connect',
-        '-vm', config.vm_name, cdrom_device
-    ]
-    
-    result = subprocess.run(cmd, env=env, capture_output=True, text=True)
+    result = session.device_connect(config.vm_name, cdrom_device)
     if result.returncode != 0:
         logger.warn(f"CD-ROM connect warning: {result.stderr}")
     else:
         logger.info(f"✅ CD-ROM device {cdrom_device} connected")
 
-def set_boot_order(config, logger, env):
+def set_boot_order(config, logger, session):
     """Set boot order to CD-ROM first, then disk"""
     logger.info("Setting boot order to CD-ROM first...")
     
     # Try to set boot order - this may not work on all ESXi versions
-    cmd = [
-        config.govc_bin, 'device.boot',
-        '-vm', config.vm_name,
-        '-order', 'cdrom,disk'
-    ]
-    
-    result = subprocess.run(cmd, env=env, capture_output=True, text=True)
+    result = session.device_boot(config.vm_name, 'cdrom,disk')
     if result.returncode == 0:
         logger.info("✅ Boot order set to CD-ROM first")
     else:
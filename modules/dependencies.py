@@ -1,10 +1,36 @@
 """Check system dependencies"""
 
+import importlib.util
 import os
-import shutil
 import subprocess
 import sys
 
+# Tools looked up on PATH by check_dependencies
+PROBED_TOOLS = ['wget', 'curl', 'mkisofs', 'genisoimage']
+
+def find_executables(names):
+    """Resolve several tools in one pass over PATH, returning name -> path or None
+    
+    Each PATH directory is listed once and only entries matching a wanted
+    name are stat'ed, instead of probing every directory once per tool.
+    """
+    found = dict.fromkeys(names)
+    wanted = set(names)
+    
+    for directory in os.environ.get('PATH', os.defpath).split(os.pathsep):
+        if not wanted:
+            break
+        try:
+            with os.scandir(directory or os.curdir) as entries:
+                for entry in entries:
+                    if entry.name in wanted and entry.is_file() and entry.stat().st_mode & 0o111:
+                        found[entry.name] = entry.path
+                        wanted.discard(entry.name)
+        except OSError:
+            continue
+    
+    return found
+
 def check_dependencies(config, logger):
     """Check all required dependencies"""
     logger.info("Checking dependencies...")
@@ -25,15 +51,18 @@ def check_dependencies(config, logger):
         except Exception as e:
             missing.append(f"govc (failed to install: {e})")
     
+    found = find_executables(PROBED_TOOLS)
+    
     # Check system tools
     required_tools = ['wget', 'curl']
     for tool in required_tools:
-        if not shutil.which(tool):
+        if not found[tool]:
             missing.append(f"{tool} (install with: brew install {tool})")
     
-    # Check ISO creation tool
-    if not shutil.which('mkisofs') and not shutil.which('genisoimage'):
-        missing.append("mkisofs or genisoimage (install with: brew install cdrtools)")
+    # Check ISO creation tool (not needed when pycdlib can build it in-process)
+    if (not importlib.util.find_spec('pycdlib')
+            and not found['mkisofs'] and not found['genisoimage']):
+        missing.append("mkisofs or genisoimage (install with: brew install cdrtools or pip install pycdlib)")
     
     if missing:
         logger.error("Missing dependencies:")
@@ -45,6 +74,7 @@ def check_dependencies(config, logger):
 
 def install_govc(config):
     """Install govc CLI tool"""
+    import io
     import urllib.request
     import tarfile
     import platform
@@ -61,9 +91,10 @@ def install_govc(config):
     
     url = f"https://github.com/vmware/govmomi/releases/latest/download/govc_{system}_{machine}.tar.gz"
     
-    # Download and extract
-    with urllib.request.urlopen(url) as response:
-        with tarfile.open(fileobj=response, mode='r|gz') as tar:
+    # Download and extract, reading the stream in 1 MiB blocks
+    request = urllib.request.Request(url, headers={'Accept-Encoding': 'identity'})
+    with urllib.request.urlopen(request) as response:
+        with tarfile.open(fileobj=io.BufferedReader(response, buffer_size=1 << 20), mode='r|gz') as tar:
             for member in tar:
                 if member.name == 'govc':
                     member.name = os.path.basename(config.govc_bin)
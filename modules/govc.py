@@ -0,0 +1,285 @@
+"""Shared govc session for ESXi operations"""
+
+import atexit
+import base64
+import functools
+import http.client
+import mmap
+import os
+import re
+import selectors
+import shutil
+import ssl
+import subprocess
+import tempfile
+import time
+import urllib.parse
+
+try:
+    from orjson import loads as json_loads
+except ImportError:
+    from json import loads as json_loads
+
+# Read size for streaming uploads to the datastore HTTP endpoint
+UPLOAD_BLOCK_SIZE = 1 << 20
+
+# "Power state: poweredOff" line in vm.info output
+_POWER_STATE_RE = re.compile(rb'^\s*Power state:\s*(\S+)', re.M)
+
+# A usable guest address: dotted IPv4, not 0.0.0.0
+_GUEST_IP_RE = re.compile(rb'^(?!0\.0\.0\.0$)\d{1,3}(?:\.\d{1,3}){3}$')
+
+# Environment variables govc uses besides its GOVC_* settings: PATH, HOME
+# for its session cache under ~/.govmomi, and proxy settings in both spellings
+_GOVC_PASSTHROUGH = (
+    'PATH', 'HOME', 'GOVMOMI_HOME',
+    'HTTP_PROXY', 'http_proxy', 'HTTPS_PROXY', 'https_proxy', 'NO_PROXY', 'no_proxy',
+)
+
+# The only parts of our environment govc needs, including any GOVC_*
+# settings the user has exported (datacenter, datastore, CA certs, ...)
+_GOVC_ENV_TEMPLATE = {
+    name: value
+    for name, value in os.environ.items()
+    if name in _GOVC_PASSTHROUGH or name.startswith('GOVC_')
+}
+
+def govc_env(config):
+    """Build the small environment passed to every govc process"""
+    return {
+        **_GOVC_ENV_TEMPLATE,
+        'GOVC_URL': config.govc_url,
+        'GOVC_INSECURE': '1',
+    }
+
+class GovcResult:
+    """Exit status and raw output of a govc command, decoded only when read"""
+    
+    def __init__(self, returncode, stdout_bytes, stderr_bytes):
+        self.returncode = returncode
+        self.stdout_bytes = stdout_bytes
+        self.stderr_bytes = stderr_bytes
+    
+    @property
+    def stdout(self):
+        return self.stdout_bytes.decode('utf-8', 'replace')
+    
+    @property
+    def stderr(self):
+        return self.stderr_bytes.decode('utf-8', 'replace')
+
+def run_govc(cmd, env, timeout=None):
+    """Run a govc command line and return a GovcResult
+    
+    Output is kept as bytes; most callers only look at the exit status, so
+    decoding is left to whoever reads stdout/stderr. Python's own descriptors
+    are non-inheritable, so close_fds=False is safe and lets the child be
+    spawned without walking the fd table.
+    """
+    with subprocess.Popen(cmd, env=env, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                          close_fds=False) as proc:
+        try:
+            stdout, stderr = proc.communicate(timeout=timeout)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+            proc.communicate()
+            raise
+    return GovcResult(proc.returncode, stdout, stderr)
+
+def json_field(data, *path):
+    """Follow a key/index path through govc -json output, None if absent
+    
+    govc releases differ in JSON key case ("VirtualMachines" vs
+    "virtualMachines"), so each key is tried as given and lower-camel.
+    """
+    for key in path:
+        if isinstance(key, int):
+            data = data[key] if isinstance(data, list) and len(data) > key else None
+        elif isinstance(data, dict):
+            value = data.get(key)
+            data = value if value is not None else data.get(key[:1].lower() + key[1:])
+        else:
+            return None
+    return data
+
+def persistent_govc_env(config):
+    """Log govc in once and return an env whose commands reuse that session
+    
+    With GOVC_PERSIST_SESSION the login cookie is cached under GOVMOMI_HOME,
+    so later govc processes skip the SOAP login. GOVMOMI_HOME is a private
+    directory for this process, so logging the session out when the script
+    exits never touches the ~/.govmomi session other scripts are sharing.
+    """
+    env = govc_env(config)
+    env['GOVC_PERSIST_SESSION'] = 'true'
+    env['GOVMOMI_HOME'] = tempfile.mkdtemp(prefix='govmomi-')
+    atexit.register(shutil.rmtree, env['GOVMOMI_HOME'], ignore_errors=True)
+    if run_govc([config.govc_bin, 'session.login'], env).returncode == 0:
+        atexit.register(run_govc, [config.govc_bin, 'session.logout'], env)
+    return env
+
+@functools.lru_cache(maxsize=1)
+def get_govc_env():
+    """persistent_govc_env() for get_config(), logged in once per process"""
+    from modules.config import get_config
+    return persistent_govc_env(get_config())
+
+def wait_power_off(config, env, vm_name, timeout=5):
+    """Poll vm.info until the VM reports poweredOff, returning False on timeout"""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        result = run_govc([config.govc_bin, 'vm.info', vm_name], env)
+        match = _POWER_STATE_RE.search(result.stdout_bytes)
+        if match and match.group(1) == b'poweredOff':
+            return True
+        time.sleep(0.1)
+    return False
+
+def stream_guest_ip(config, env, vm_name, timeout):
+    """Wait for the VM's guest IPv4 address, returning it or None
+    
+    'object.collect -n' keeps one property collector session open and
+    prints guest.ipAddress each time ESXi pushes a change, so nothing is
+    polled. None comes back on timeout, or early if govc exits without an
+    address (e.g. object.collect unsupported), leaving the caller time to
+    fall back to polling vm.ip.
+    """
+    deadline = time.monotonic() + timeout
+    cmd = [config.govc_bin, 'object.collect', '-s', '-n', '1000', f'vm/{vm_name}', 'guest.ipAddress']
+    proc = subprocess.Popen(cmd, env=env, stdin=subprocess.DEVNULL, stdout=subprocess.PIPE,
+                            stderr=subprocess.DEVNULL)
+    partial = b''
+    try:
+        with selectors.DefaultSelector() as selector:
+            selector.register(proc.stdout, selectors.EVENT_READ)
+            while True:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return None
+                if not selector.select(remaining):
+                    continue
+                chunk = os.read(proc.stdout.fileno(), 4096)
+                if not chunk:
+                    return None
+                *lines, partial = (partial + chunk).split(b'\n')
+                for line in lines:
+                    if _GUEST_IP_RE.match(line.strip()):
+                        return line.strip().decode()
+    finally:
+        if proc.poll() is None:
+            proc.kill()
+        proc.wait()
+        proc.stdout.close()
+
+def wait_guest_ip(config, env, vm_name, timeout):
+    """Block until the VM reports a guest IPv4 address, returning it or None
+    
+    Waits on the guest.ipAddress stream; if that is unavailable, one
+    'vm.ip -wait' call does the waiting inside govc for the time left.
+    """
+    deadline = time.monotonic() + timeout
+    ip = stream_guest_ip(config, env, vm_name, timeout)
+    remaining = int(deadline - time.monotonic())
+    if ip or remaining < 1:
+        return ip
+    
+    cmd = [config.govc_bin, 'vm.ip', '-v4', '-wait', f'{remaining}s', vm_name]
+    try:
+        result = run_govc(cmd, env, timeout=remaining + 5)
+    except subprocess.TimeoutExpired:
+        return None
+    ip = result.stdout_bytes.strip()
+    return ip.decode() if result.returncode == 0 and _GUEST_IP_RE.match(ip) else None
+
+class GovcSession:
+    """Run govc commands against one ESXi host through a single login
+
+    govc persists its SOAP session cookie under ~/.govmomi/sessions keyed by
+    GOVC_URL, so every command issued through the same session object reuses
+    one authenticated session instead of logging in again per call.
+    """
+
+    def __init__(self, config):
+        self.govc_bin = config.govc_bin
+        self.env = govc_env(config)
+        self.env['GOVC_PERSIST_SESSION'] = 'true'
+        
+        # Direct HTTPS access to the host's /folder datastore endpoint
+        self.esxi_host = config.esxi_host
+        credentials = f"{config.esxi_user}:{config.esxi_password}".encode()
+        self._auth_header = "Basic " + base64.b64encode(credentials).decode()
+        self._https = None
+
+    def run(self, *args):
+        """Run a govc subcommand and return its GovcResult"""
+        return run_govc([self.govc_bin, *args], self.env)
+
+    def disk_change(self, vm_name, size_gb, *selector):
+        """Resize a VM disk, optionally selected by label, key or name flags"""
+        return self.run('vm.disk.change', '-vm', vm_name, *selector, '-size', f'{size_gb}G')
+
+    def upload(self, datastore, local_path, remote_path):
+        """Upload a local file to a datastore path"""
+        return self.run('datastore.upload', '-ds', datastore, local_path, remote_path)
+
+    def http_upload(self, datastore, local_path, remote_path):
+        """PUT a file straight to the datastore over HTTPS, returning the status code
+        
+        The connection is kept open on the session so later uploads reuse the
+        TLS handshake. Certificates are not verified, matching GOVC_INSECURE.
+        The file must not be empty, since it is memory-mapped.
+        """
+        query = urllib.parse.urlencode({'dcPath': 'ha-datacenter', 'dsName': datastore})
+        url = f"/folder/{urllib.parse.quote(remote_path)}?{query}"
+        headers = {
+            'Authorization': self._auth_header,
+            'Content-Type': 'application/octet-stream',
+            'Content-Length': str(os.path.getsize(local_path)),
+        }
+        
+        if self._https is None:
+            self._https = http.client.HTTPSConnection(
+                self.esxi_host, context=ssl._create_unverified_context(),
+                timeout=300, blocksize=UPLOAD_BLOCK_SIZE
+            )
+        
+        try:
+            # Send straight from a read-only mapping of the file. A memoryview
+            # has no read(), so http.client hands it to sendall() whole
+            # instead of copying it through blocksize reads.
+            with open(local_path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                if hasattr(mapped, 'madvise'):
+                    mapped.madvise(mmap.MADV_SEQUENTIAL)
+                with memoryview(mapped) as body:
+                    self._https.request('PUT', url, body=body, headers=headers)
+            response = self._https.getresponse()
+            response.read()
+            return response.status
+        except Exception:
+            self._https.close()
+            self._https = None
+            raise
+
+    def cdrom_add(self, vm_name):
+        """Add a CD-ROM device to a VM"""
+        return self.run('device.cdrom.add', '-vm', vm_name)
+
+    def cdrom_insert(self, vm_name, datastore, iso_path):
+        """Insert a datastore ISO into the VM's CD-ROM"""
+        return self.run('device.cdrom.insert', '-vm', vm_name, '-ds', datastore, iso_path)
+
+    def device_ls(self, vm_name):
+        """List VM devices"""
+        return self.run('device.ls', '-vm', vm_name)
+
+    def device_connect(self, vm_name, device):
+        """Connect a VM device"""
+        return self.run('device.connect', '-vm', vm_name, device)
+
+    def device_boot(self, vm_name, order):
+        """Set the VM boot order"""
+        return self.run('device.boot', '-vm', vm_name, '-order', order)
+
+    def power_on(self, vm_name):
+        """Power on a VM"""
+        return self.run('vm.power', '-on', vm_name)
@@ -1,6 +1,14 @@
 """Simple logging functionality"""
 
+import functools
+import os
+import sys
+import threading
+
 class Logger:
+    # Serialises output from pipeline steps running on worker threads
+    _lock = threading.Lock()
+    
     def __init__(self):
         # ANSI color codes
         self.GREEN = '\033[0;32m'
@@ -8,18 +16,44 @@ class Logger:
         self.RED = '\033[0;31m'
         self.NC = '\033[0m'  # No Color
     
+    def _write(self, line, flush=False):
+        # One write per line instead of print()'s separate text and newline
+        # writes; stdout's own buffering decides when it reaches the terminal
+        with self._lock:
+            sys.stdout.write(line + '\n')
+            if flush:
+                sys.stdout.flush()
+    
     def info(self, message):
         """Log info message"""
-        print(f"{self.GREEN}[INFO]{self.NC} {message}")
+        self._write(f"{self.GREEN}[INFO]{self.NC} {message}")
     
     def warn(self, message):
         """Log warning message"""
-        print(f"{self.YELLOW}[WARN]{self.NC} {message}")
+        self._write(f"{self.YELLOW}[WARN]{self.NC} {message}", flush=True)
     
     def error(self, message):
         """Log error message"""
-        print(f"{self.RED}[ERROR]{self.NC} {message}")
+        self._write(f"{self.RED}[ERROR]{self.NC} {message}", flush=True)
     
     def status(self, message):
         """Log status without prefix"""
-        print(message)
+        self._write(message)
+    
+    def progress(self, message):
+        """Overwrite the current terminal line with a progress message"""
+        with self._lock:
+            sys.stdout.write('\r' + message)
+            sys.stdout.flush()
+    
+    def dot(self):
+        """Print a progress dot straight to the terminal"""
+        with self._lock:
+            # Anything still buffered has to go out ahead of the dot
+            sys.stdout.flush()
+            os.write(sys.stdout.fileno(), b'.')
+
+@functools.lru_cache(maxsize=1)
+def get_logger():
+    """Logger shared by every caller in the process"""
+    return Logger()
@@ -1,16 +1,17 @@
 """Monitor VM deployment progress"""
 
+import asyncio
 import subprocess
 import time
-import os
+
+from modules.govc import govc_env, run_govc
+from modules.ssh import ssh_command, start_ssh_master, stop_ssh_master
 
 def wait_for_completion(config, logger):
     """Wait for VM to complete setup and get IP"""
     logger.info("Waiting for VM to complete setup...")
     
-    env = os.environ.copy()
-    env['GOVC_URL'] = f"https://{config.esxi_user}:{config.esxi_password}@{config.esxi_host}/sdk"
-    env['GOVC_INSECURE'] = '1'
+    env = govc_env(config)
     
     # Wait for IP address
     vm_ip = wait_for_ip(config, logger, env)
@@ -44,25 +45,46 @@ def wait_for_ip(config, logger, env, max_attempts=60):
     """Wait for VM to get IP address"""
     logger.info("Waiting for VM IP address...")
     
-    for attempt in range(max_attempts):
+    # vm.ip -wait blocks on a property collector until the guest reports an
+    # address, so one govc process normally covers the whole wait. A failed
+    # call (SOAP or network error, tools not up yet) is retried every 10s
+    # until the deadline, and older govc without -wait is polled instead.
+    deadline = time.monotonic() + max_attempts * 10
+    use_wait = True
+    dotted = False
+    
+    while time.monotonic() < deadline:
+        remaining = deadline - time.monotonic()
         try:
-            cmd = [config.govc_bin, 'vm.ip', config.vm_name]
-            result = subprocess.run(cmd, env=env, capture_output=True, text=True)
+            if use_wait:
+                cmd = [config.govc_bin, 'vm.ip', '-wait', f'{max(1, int(remaining))}s', config.vm_name]
+                result = run_govc(cmd, env, timeout=remaining + 30)
+            else:
+                cmd = [config.govc_bin, 'vm.ip', config.vm_name]
+                result = run_govc(cmd, env)
             
             if result.returncode == 0:
                 ip = result.stdout.strip()
                 if ip and ip != "0.0.0.0":
+                    if dotted:
+                        logger.status('')  # New line after dots
                     logger.info(f"✅ VM IP: {ip}")
                     return ip
+            elif use_wait and 'flag provided but not defined' in result.stderr:
+                use_wait = False
+                continue
             
-            print(".", end="", flush=True)
-            time.sleep(10)
-            
+        except subprocess.TimeoutExpired:
+            break
         except Exception as e:
             logger.warn(f"Error getting IP: {e}")
-            time.sleep(10)
+        
+        logger.dot()
+        dotted = True
+        time.sleep(min(10, max(0, deadline - time.monotonic())))
     
-    print()  # New line after dots
+    if dotted:
+        logger.status('')  # New line after dots
     logger.warn("VM didn't get IP address yet - may need more time")
     return None
 
@@ -77,43 +99,113 @@ def wait_for_cloud_init(config, logger, wait_minutes=10):
     
     logger.info("✅ Cloud-init should be complete")
 
-def wait_for_cloud_init_completion(config, logger, vm_ip):
+async def wait_for_ssh_port(vm_ip, port=22, timeout=120):
+    """Probe the SSH port with exponential back-off until it accepts connections"""
+    async def probe():
+        delay = 1
+        while True:
+            try:
+                _, writer = await asyncio.wait_for(asyncio.open_connection(vm_ip, port), timeout=2)
+                writer.close()
+                return True
+            except (OSError, asyncio.TimeoutError):
+                await asyncio.sleep(delay)
+                delay = min(delay * 1.5, 30)
+    
+    try:
+        return await asyncio.wait_for(probe(), timeout=timeout)
+    except asyncio.TimeoutError:
+        return False
+
+def wait_for_cloud_init_completion(config, logger, vm_ip, wait_minutes=10):
     """Monitor cloud-init completion via SSH"""
     logger.info("Monitoring cloud-init progress via SSH...")
     
-    # Wait a bit for SSH to be ready
-    time.sleep(30)
+    # Wait for sshd to accept connections instead of a fixed warm-up delay
+    if not asyncio.run(wait_for_ssh_port(vm_ip)):
+        logger.info(f"SSH port on {vm_ip} not open yet - continuing to poll")
+    
+    # Every probe below reuses one authenticated connection
+    master_started = start_ssh_master(vm_ip)
+    try:
+        # Block on the VM until cloud-init finishes, polling only if SSH
+        # isn't usable yet
+        if master_started and long_poll_cloud_init(config, logger, vm_ip, wait_minutes):
+            return
+        poll_cloud_init_status(config, logger, vm_ip, master_started)
+    finally:
+        stop_ssh_master(vm_ip)
+
+def long_poll_cloud_init(config, logger, vm_ip, wait_minutes):
+    """Wait server-side with 'cloud-init status --wait', returning False to fall back to polling"""
+    logger.info("✅ SSH connection established")
+    logger.info(f"🔄 Waiting up to {wait_minutes} minutes for cloud-init to finish...")
     
+    try:
+        status_cmd = subprocess.run(
+            ssh_command(vm_ip, 'if command -v cloud-init >/dev/null; then sudo cloud-init status --wait 2>/dev/null; '
+                               'else echo "cloud-init not available"; fi'),
+            capture_output=True, text=True, timeout=wait_minutes * 60
+        )
+    except subprocess.TimeoutExpired:
+        log_monitoring_timeout(config, logger, vm_ip)
+        return True
+    
+    status = status_cmd.stdout.strip()
+    
+    if "not available" in status:
+        logger.info("ℹ️  Cloud-init not available on this VM")
+        logger.info("VM appears to be ready - skipping cloud-init monitoring")
+        verify_installations(vm_ip, logger)
+        return True
+    elif 'done' in status:
+        logger.info("✅ Cloud-init completed successfully!")
+        
+        # Show final installations
+        logger.info("Verifying installations...")
+        verify_installations(vm_ip, logger)
+        return True
+    elif 'error' in status:
+        logger.warn("❌ Cloud-init reported errors")
+        logger.info("Check logs with: python3 scripts/diagnostics/check_cloudinit.py " + config.vm_name)
+        return True
+    
+    # SSH dropped (e.g. a reboot) or the status was unrecognised
+    logger.info(f"Cloud-init wait returned '{status or status_cmd.returncode}' - polling instead")
+    return False
+
+def log_monitoring_timeout(config, logger, vm_ip):
+    """Tell the user how to keep checking after monitoring gives up"""
+    logger.warn("Cloud-init monitoring timed out - VM may still be setting up")
+    logger.info("Check status manually with: python3 scripts/diagnostics/check_cloudinit.py " + config.vm_name)
+    logger.info(f"Or try SSH directly: ssh ubuntu@{vm_ip}")
+
+def poll_cloud_init_status(config, logger, vm_ip, master_started):
+    """Poll cloud-init status over SSH until it finishes or times out"""
     max_attempts = 20  # 20 attempts * 30 seconds = 10 minutes
     ssh_ready = False
     
     for attempt in range(max_attempts):
         try:
             # Test SSH connectivity with short timeout
-            ssh_test = subprocess.run([
-                'ssh', 
-                '-o', 'ConnectTimeout=3',
-                '-o', 'ConnectionAttempts=1',
-                '-o', 'StrictHostKeyChecking=no',
-                '-o', 'BatchMode=yes',
-                '-o', 'UserKnownHostsFile=/dev/null',
-                f'ubuntu@{vm_ip}', 'echo "SSH ready"'
-            ], capture_output=True, text=True, timeout=5)
+            ssh_test = subprocess.run(
+                ssh_command(vm_ip, 'echo "SSH ready"', batch_mode=True),
+                capture_output=True, text=True, timeout=5
+            )
             
             if ssh_test.returncode == 0:
                 if not ssh_ready:
                     logger.info("✅ SSH connection established")
                     ssh_ready = True
                 
+                if not master_started:
+                    master_started = start_ssh_master(vm_ip)
+                
                 # Check cloud-init status
-                status_cmd = subprocess.run([
-                    'ssh',
-                    '-o', 'ConnectTimeout=3',
-                    '-o', 'ConnectionAttempts=1', 
-                    '-o', 'StrictHostKeyChecking=no',
-                    '-o', 'UserKnownHostsFile=/dev/null',
-                    f'ubuntu@{vm_ip}', 'sudo cloud-init status --wait 2>/dev/null || echo "cloud-init not available"'
-                ], capture_output=True, text=True, timeout=10)
+                status_cmd = subprocess.run(
+                    ssh_command(vm_ip, 'sudo cloud-init status --wait 2>/dev/null || echo "cloud-init not available"'),
+                    capture_output=True, text=True, timeout=10
+                )
                 
                 if status_cmd.returncode == 0:
                     status = status_cmd.stdout.strip()
@@ -144,52 +236,39 @@ def wait_for_cloud_init_completion(config, logger, vm_ip):
                 # SSH not ready yet
                 if attempt % 4 == 0:  # Every 2 minutes
                     logger.info(f"Waiting for SSH access to {vm_ip}... (attempt {attempt + 1}/{max_attempts})")
-                print(".", end="", flush=True)
+                logger.dot()
                         
         except subprocess.TimeoutExpired:
             logger.info(f"SSH timeout (attempt {attempt + 1}/{max_attempts})")
         except Exception as e:
             if attempt % 4 == 0:  # Don't spam errors
                 logger.info(f"SSH not ready yet: {str(e)[:50]}...")
-            print(".", end="", flush=True)
+            logger.dot()
         
         time.sleep(30)  # Wait 30 seconds between checks
     
     print()  # New line after dots
-    logger.warn("Cloud-init monitoring timed out - VM may still be setting up")
-    logger.info("Check status manually with: python3 scripts/diagnostics/check_cloudinit.py " + config.vm_name)
-    logger.info(f"Or try SSH directly: ssh ubuntu@{vm_ip}")
+    log_monitoring_timeout(config, logger, vm_ip)
 
 def verify_installations(vm_ip, logger):
     """Verify Docker and Go installations"""
     try:
-        # Check Docker
-        docker_cmd = subprocess.run([
-            'ssh', 
-            '-o', 'ConnectTimeout=3',
-            '-o', 'ConnectionAttempts=1',
-            '-o', 'StrictHostKeyChecking=no',
-            '-o', 'UserKnownHostsFile=/dev/null',
-            f'ubuntu@{vm_ip}', 'docker --version'
-        ], capture_output=True, text=True, timeout=10)
+        # Check Docker and Go in one round-trip - a tool that is missing
+        # prints nothing, leaving its half of the output empty
+        check_cmd = subprocess.run(
+            ssh_command(vm_ip, 'docker --version 2>/dev/null; echo ---; /usr/local/go/bin/go version 2>/dev/null'),
+            capture_output=True, text=True, timeout=10
+        )
+        
+        docker_version, _, go_version = check_cmd.stdout.partition('---\n')
         
-        if docker_cmd.returncode == 0:
-            logger.info(f"✅ Docker: {docker_cmd.stdout.strip()}")
+        if docker_version.strip():
+            logger.info(f"✅ Docker: {docker_version.strip()}")
         else:
             logger.info("⚠️  Docker not ready yet")
         
-        # Check Go
-        go_cmd = subprocess.run([
-            'ssh', 
-            '-o', 'ConnectTimeout=3',
-            '-o', 'ConnectionAttempts=1',
-            '-o', 'StrictHostKeyChecking=no',
-            '-o', 'UserKnownHostsFile=/dev/null',
-            f'ubuntu@{vm_ip}', '/usr/local/go/bin/go version'
-        ], capture_output=True, text=True, timeout=10)
-        
-        if go_cmd.returncode == 0:
-            logger.info(f"✅ Go: {go_cmd.stdout.strip()}")
+        if go_version.strip():
+            logger.info(f"✅ Go: {go_version.strip()}")
         else:
             logger.info("⚠️  Go not ready yet")
             
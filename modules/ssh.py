@@ -0,0 +1,110 @@
+"""SSH helpers shared by the deploy monitor and the check and fix scripts"""
+
+import functools
+import shutil
+import subprocess
+
+# Common options for every ssh call to a VM
+SSH_OPTIONS = [
+    '-o', 'ConnectTimeout=3',
+    '-o', 'ConnectionAttempts=1',
+    '-o', 'StrictHostKeyChecking=no',
+    '-o', 'UserKnownHostsFile=/dev/null',
+]
+
+# How long an idle master connection outlives its last session
+CONTROL_PERSIST = '5m'
+
+# Default password set by the cloud-init user-data
+SSH_PASSWORD = 'ubuntu'
+
+def ssh_control_path(vm_ip):
+    """ControlMaster socket shared by every ssh call to the VM"""
+    return f"/tmp/ssh-%C-{vm_ip}"
+
+def ssh_base(vm_ip, batch_mode=False):
+    """ssh argv, up to the remote command, that multiplexes over the VM's master
+
+    If no master is running ssh just connects directly, so callers work
+    either way.
+    """
+    cmd = ['ssh', *SSH_OPTIONS,
+           '-o', 'ControlMaster=auto',
+           '-o', f'ControlPath={ssh_control_path(vm_ip)}']
+    if batch_mode:
+        cmd += ['-o', 'BatchMode=yes']
+    return cmd + [f'ubuntu@{vm_ip}']
+
+def ssh_command(vm_ip, remote_command, batch_mode=False):
+    """Build an ssh command that multiplexes over the VM's master connection"""
+    return ssh_base(vm_ip, batch_mode) + [remote_command]
+
+@functools.lru_cache(maxsize=1)
+def sshpass_available():
+    """Check if sshpass is available"""
+    return shutil.which('sshpass') is not None
+
+def ssh_master_attempts(vm_ip, password=None):
+    """Master connection argvs to try in turn
+
+    Key auth comes first, under BatchMode so a missing key fails at once.
+    With a password and sshpass installed, a password login follows, after
+    which sessions over the master need no password at all.
+    """
+    argv = ['ssh', '-M', '-N', '-f', *SSH_OPTIONS,
+            '-o', f'ControlPersist={CONTROL_PERSIST}',
+            '-o', f'ControlPath={ssh_control_path(vm_ip)}',
+            f'ubuntu@{vm_ip}']
+    attempts = [argv[:1] + ['-o', 'BatchMode=yes'] + argv[1:]]
+    if password and sshpass_available():
+        attempts.append(['sshpass', '-p', password] + argv)
+    return attempts
+
+def start_ssh_master(vm_ip, password=None):
+    """Open a background master connection, returning True once it is up"""
+    for argv in ssh_master_attempts(vm_ip, password):
+        # -f leaves the master running with our fds, so never hand it a pipe
+        try:
+            result = subprocess.run(argv, stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL,
+                                    stderr=subprocess.DEVNULL, timeout=10)
+        except subprocess.TimeoutExpired:
+            return False
+        if result.returncode == 0:
+            return True
+    return False
+
+def stop_ssh_master(vm_ip):
+    """Close the background master connection if one is running"""
+    try:
+        subprocess.run([
+            'ssh', '-O', 'exit',
+            '-o', f'ControlPath={ssh_control_path(vm_ip)}',
+            f'ubuntu@{vm_ip}'
+        ], stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, timeout=5)
+    except subprocess.TimeoutExpired:
+        pass
+
+# Report scripts are fed to 'bash -s' and print one ===TAG=== section per
+# probe, each followed by RC=<exit code>, e.g.
+#   echo "===DF==="; df -h / 2>&1; echo "RC=$?"
+
+def parse_report(stdout):
+    """Split a report script's output into {tag: (exit code, output)}"""
+    sections = {}
+    tag = None
+    lines = []
+    for line in stdout.splitlines():
+        if line.startswith('===') and line.endswith('===') and len(line) > 6:
+            tag, lines = line.strip('='), []
+        elif tag and line.startswith('RC='):
+            sections[tag] = (int(line[3:]), '\n'.join(lines).strip())
+            tag = None
+        elif tag:
+            lines.append(line)
+    return sections
+
+def run_report(vm_ip, script, timeout):
+    """Run a report script in one remote shell and parse its sections"""
+    result = subprocess.run(ssh_command(vm_ip, 'bash -s'), input=script,
+                            capture_output=True, text=True, timeout=timeout)
+    return parse_report(result.stdout)
@@ -5,110 +5,164 @@ Verifies Docker installation and provides rootless setup
 """
 
 import sys
+import asyncio
+import socket
 import subprocess
 import os
 
+# Add project root to path
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from modules.ssh import SSH_PASSWORD, parse_report, ssh_base, ssh_master_attempts, start_ssh_master, stop_ssh_master
+
+# How long to wait for the VM's SSH port to accept a TCP connection
+PORT_PROBE_TIMEOUT = 0.5
+
+# _collect_docker_report result when nothing answers on port 22
+SSH_UNREACHABLE = 'unreachable'
+
+def _ssh_port_open(vm_ip):
+    """Quick TCP check of port 22, so a dead VM fails without waiting on ssh"""
+    try:
+        socket.create_connection((vm_ip, 22), timeout=PORT_PROBE_TIMEOUT).close()
+        return True
+    except OSError:
+        return False
+
+# Remote script for check_docker_installation: one ===TAG=== section per probe.
+# Probes judged only by exit code send their output to /dev/null on the VM.
+DOCKER_REPORT_SCRIPT = (
+    'echo "===VER==="; docker --version 2>&1; echo "RC=$?"; '
+    'echo "===SVC==="; systemctl is-active docker 2>&1; echo "RC=$?"; '
+    'echo "===PS==="; docker ps >/dev/null 2>&1; echo "RC=$?"; '
+    'echo "===ROOTLESS==="; ls -la ~/setup-docker-rootless.sh >/dev/null 2>&1; echo "RC=$?"'
+)
+
+async def _run_ssh(vm_ip, command, timeout):
+    """Run a remote command without blocking the event loop, returning (exit code, stdout)"""
+    proc = await asyncio.create_subprocess_exec(
+        *ssh_base(vm_ip), command,
+        stdin=asyncio.subprocess.DEVNULL, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.DEVNULL
+    )
+    try:
+        stdout, _ = await asyncio.wait_for(proc.communicate(), timeout)
+    except asyncio.TimeoutError:
+        proc.kill()
+        await proc.wait()
+        raise subprocess.TimeoutExpired(command, timeout)
+    return proc.returncode, stdout.decode('utf-8', 'replace')
+
+async def _collect_docker_report(vm_ip):
+    """Probe one VM, returning its report sections, None if SSH fails or SSH_UNREACHABLE"""
+    try:
+        _, writer = await asyncio.wait_for(asyncio.open_connection(vm_ip, 22), PORT_PROBE_TIMEOUT)
+        writer.close()
+    except (OSError, asyncio.TimeoutError):
+        return SSH_UNREACHABLE
+    
+    # Test SSH by opening the master connection the probes will share,
+    # falling back to the default password for VMs deployed without a key
+    for argv in ssh_master_attempts(vm_ip, SSH_PASSWORD):
+        proc = await asyncio.create_subprocess_exec(
+            *argv,
+            stdin=asyncio.subprocess.DEVNULL, stdout=asyncio.subprocess.DEVNULL, stderr=asyncio.subprocess.DEVNULL
+        )
+        try:
+            rc = await asyncio.wait_for(proc.wait(), 10)
+        except asyncio.TimeoutError:
+            proc.kill()
+            await proc.wait()
+            raise subprocess.TimeoutExpired('ssh -M', 10)
+        if rc == 0:
+            break
+    else:
+        return None
+    
+    # Run every Docker probe in one remote shell; each section reports
+    # its own exit code
+    _, stdout = await _run_ssh(vm_ip, DOCKER_REPORT_SCRIPT, 30)
+    return parse_report(stdout)
+
+async def _collect_docker_reports(vm_ips):
+    return await asyncio.gather(*(_collect_docker_report(vm_ip) for vm_ip in vm_ips), return_exceptions=True)
+
+def check_docker_installations(vm_ips):
+    """Probe several VMs concurrently, then print each report in order"""
+    reports = asyncio.run(_collect_docker_reports(vm_ips))
+    return [print_docker_report(vm_ip, report) for vm_ip, report in zip(vm_ips, reports)]
+
 def check_docker_installation(vm_ip):
     """Check Docker installation status on VM"""
+    return check_docker_installations([vm_ip])[0]
+
+def print_docker_report(vm_ip, report):
+    """Print one VM's Docker status, returning True if Docker is installed"""
     print(f"🐳 Checking Docker installation on {vm_ip}...")
     
-    try:
-        # Test SSH connection first
-        ssh_test = subprocess.run([
-            'ssh', 
-            '-o', 'ConnectTimeout=3',
-            '-o', 'ConnectionAttempts=1',
-            '-o', 'StrictHostKeyChecking=no',
-            '-o', 'UserKnownHostsFile=/dev/null',
-            f'ubuntu@{vm_ip}', 'echo "SSH OK"'
-        ], capture_output=True, text=True, timeout=5)
-        
-        if ssh_test.returncode != 0:
-            print("❌ SSH connection failed")
-            return False
-        
-        print("✅ SSH connection successful")
-        
-        # Check if Docker is installed
-        docker_check = subprocess.run([
-            'ssh', 
-            '-o', 'ConnectTimeout=3',
-            '-o', 'StrictHostKeyChecking=no',
-            '-o', 'UserKnownHostsFile=/dev/null',
-            f'ubuntu@{vm_ip}', 'docker --version'
-        ], capture_output=True, text=True, timeout=10)
-        
-        if docker_check.returncode == 0:
-            print(f"✅ Docker installed: {docker_check.stdout.strip()}")
-        else:
-            print("❌ Docker not installed or not working")
-            return False
-        
-        # Check Docker service status
-        service_check = subprocess.run([
-            'ssh', 
-            '-o', 'ConnectTimeout=3',
-            '-o', 'StrictHostKeyChecking=no',
-            '-o', 'UserKnownHostsFile=/dev/null',
-            f'ubuntu@{vm_ip}', 'systemctl is-active docker'
-        ], capture_output=True, text=True, timeout=10)
-        
-        if service_check.returncode == 0:
-            print(f"✅ Docker service: {service_check.stdout.strip()}")
-        else:
-            print("⚠️  Docker service not running")
-        
-        # Check if user can run Docker
-        user_check = subprocess.run([
-            'ssh', 
-            '-o', 'ConnectTimeout=3',
-            '-o', 'StrictHostKeyChecking=no',
-            '-o', 'UserKnownHostsFile=/dev/null',
-            f'ubuntu@{vm_ip}', 'docker ps'
-        ], capture_output=True, text=True, timeout=10)
-        
-        if user_check.returncode == 0:
-            print("✅ User can run Docker commands")
-        else:
-            print("⚠️  User cannot run Docker (may need logout/login or rootless setup)")
-        
-        # Check if rootless setup script exists
-        rootless_check = subprocess.run([
-            'ssh', 
-            '-o', 'ConnectTimeout=3',
-            '-o', 'StrictHostKeyChecking=no',
-            '-o', 'UserKnownHostsFile=/dev/null',
-            f'ubuntu@{vm_ip}', 'ls -la ~/setup-docker-rootless.sh'
-        ], capture_output=True, text=True, timeout=10)
-        
-        if rootless_check.returncode == 0:
-            print("✅ Rootless Docker setup script available")
-            print("   Run: ssh ubuntu@{} './setup-docker-rootless.sh'".format(vm_ip))
-        else:
-            print("ℹ️  Rootless setup script not found")
-        
-        return True
-        
-    except subprocess.TimeoutExpired:
+    if isinstance(report, subprocess.TimeoutExpired):
         print("❌ Connection timeout")
         return False
-    except Exception as e:
-        print(f"❌ Error: {e}")
+    if isinstance(report, Exception):
+        print(f"❌ Error: {report}")
         return False
+    if report == SSH_UNREACHABLE:
+        print("❌ VM unreachable on :22")
+        return False
+    if report is None:
+        print("❌ SSH connection failed")
+        return False
+    
+    print("✅ SSH connection successful")
+    
+    # Check if Docker is installed
+    rc, output = report.get('VER', (1, ''))
+    if rc == 0:
+        print(f"✅ Docker installed: {output}")
+    else:
+        print("❌ Docker not installed or not working")
+        return False
+    
+    # Check Docker service status
+    rc, output = report.get('SVC', (1, ''))
+    if rc == 0:
+        print(f"✅ Docker service: {output}")
+    else:
+        print("⚠️  Docker service not running")
+    
+    # Check if user can run Docker
+    rc, _ = report.get('PS', (1, ''))
+    if rc == 0:
+        print("✅ User can run Docker commands")
+    else:
+        print("⚠️  User cannot run Docker (may need logout/login or rootless setup)")
+    
+    # Check if rootless setup script exists
+    rc, _ = report.get('ROOTLESS', (1, ''))
+    if rc == 0:
+        print("✅ Rootless Docker setup script available")
+        print("   Run: ssh ubuntu@{} './setup-docker-rootless.sh'".format(vm_ip))
+    else:
+        print("ℹ️  Rootless setup script not found")
+    
+    return True
 
 def setup_rootless_docker(vm_ip):
     """Run the rootless Docker setup on the VM"""
     print(f"🔧 Setting up rootless Docker on {vm_ip}...")
     
     try:
+        if not _ssh_port_open(vm_ip):
+            print("❌ VM unreachable on :22")
+            return
+        
+        if not start_ssh_master(vm_ip, SSH_PASSWORD):
+            print("❌ SSH connection failed")
+            return
+        
+        base = ssh_base(vm_ip)
+        
         # First, check if the setup script exists
-        check_script = subprocess.run([
-            'ssh', 
-            '-o', 'ConnectTimeout=3',
-            '-o', 'StrictHostKeyChecking=no',
-            '-o', 'UserKnownHostsFile=/dev/null',
-            f'ubuntu@{vm_ip}', 'ls -la ~/setup-docker-rootless.sh'
-        ], capture_output=True, text=True, timeout=10)
+        check_script = subprocess.run(base + ['ls -la ~/setup-docker-rootless.sh'], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, timeout=10)
         
         if check_script.returncode != 0:
             print("❌ Rootless setup script not found")
@@ -119,26 +173,14 @@ def setup_rootless_docker(vm_ip):
         print("Running rootless Docker setup (this may take a minute)...")
         
         # Run the rootless setup script
-        setup_cmd = subprocess.run([
-            'ssh', 
-            '-o', 'ConnectTimeout=3',
-            '-o', 'StrictHostKeyChecking=no',
-            '-o', 'UserKnownHostsFile=/dev/null',
-            f'ubuntu@{vm_ip}', './setup-docker-rootless.sh'
-        ], timeout=120)  # Allow 2 minutes for setup
+        setup_cmd = subprocess.run(base + ['./setup-docker-rootless.sh'], timeout=120)  # Allow 2 minutes for setup
         
         if setup_cmd.returncode == 0:
             print("✅ Rootless Docker setup completed")
             print("\n🚀 Testing rootless Docker...")
             
             # Test rootless Docker
-            test_cmd = subprocess.run([
-                'ssh', 
-                '-o', 'ConnectTimeout=3',
-                '-o', 'StrictHostKeyChecking=no',
-                '-o', 'UserKnownHostsFile=/dev/null',
-                f'ubuntu@{vm_ip}', 'source ~/.bashrc && docker ps'
-            ], capture_output=True, text=True, timeout=30)
+            test_cmd = subprocess.run(base + ['source ~/.bashrc && docker ps'], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, timeout=30)
             
             if test_cmd.returncode == 0:
                 print("✅ Rootless Docker is working!")
@@ -160,20 +202,28 @@ def setup_rootless_docker(vm_ip):
 def main():
     if len(sys.argv) < 2:
         print("Usage:")
-        print("  python3 check_docker.py <vm-ip>           - Check Docker installation")
-        print("  python3 check_docker.py <vm-ip> setup     - Setup rootless Docker")
+        print("  python3 check_docker.py <vm-ip> [<vm-ip> ...] - Check Docker installation")
+        print("  python3 check_docker.py <vm-ip> setup         - Setup rootless Docker")
         print("")
         print("Examples:")
         print("  python3 check_docker.py 192.168.1.170")
+        print("  python3 check_docker.py 192.168.1.170 192.168.1.171")
         print("  python3 check_docker.py 192.168.1.170 setup")
         sys.exit(1)
     
-    vm_ip = sys.argv[1]
-    
     if len(sys.argv) > 2 and sys.argv[2] == 'setup':
-        setup_rootless_docker(vm_ip)
+        vm_ips = [sys.argv[1]]
     else:
-        check_docker_installation(vm_ip)
+        vm_ips = sys.argv[1:]
+    
+    try:
+        if len(sys.argv) > 2 and sys.argv[2] == 'setup':
+            setup_rootless_docker(vm_ips[0])
+        else:
+            check_docker_installations(vm_ips)
+    finally:
+        for vm_ip in vm_ips:
+            stop_ssh_master(vm_ip)
 
 if __name__ == "__main__":
     main()
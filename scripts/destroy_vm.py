@@ -7,14 +7,11 @@ Safely removes VMs and cleans up associated resources
 import sys
 import os
 import subprocess
-import time
+from concurrent.futures import ThreadPoolExecutor
 
 # Add project root to path for imports
 sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
 
-from modules.config import Config
-from modules.logger import Logger
-
 def list_vms_for_deletion(config, logger, env):
     """List all VMs that can be deleted"""
     logger.info("📋 Available VMs for deletion:")
@@ -24,33 +21,27 @@ def list_vms_for_deletion(config, logger, env):
         cmd = [config.govc_bin, 'ls', '/*/vm/']
         result = subprocess.run(cmd, env=env, capture_output=True, text=True)
         
-        all_vms = [line.strip() for line in result.stdout.split('\n') if line.strip()]
+        all_vms = [line for line in map(str.strip, result.stdout.splitlines()) if line]
         
         if not all_vms:
             logger.warn("No VMs found")
             return []
         
+        # Get every VM's power state up front
+        power_states = get_power_states(config, env)
+        
         # Show all VMs with numbers
         vm_list = []
         for i, vm_path in enumerate(all_vms, 1):
-            vm_name = vm_path.split('/')[-1]
+            vm_name = vm_path.rsplit('/', 1)[-1]
             
-            # Get power state
-            try:
-                power_cmd = [config.govc_bin, 'vm.info', vm_name]
-                power_result = subprocess.run(power_cmd, env=env, capture_output=True, text=True)
+            if power_states is None:
                 power_state = "unknown"
-                for line in power_result.stdout.split('\n'):
-                    if 'Power state:' in line:
-                        power_state = line.split(':')[1].strip()
-                        break
-                
-                print(f"  {i}. {vm_name} ({power_state})")
-                vm_list.append(vm_name)
-                
-            except Exception as e:
-                print(f"  {i}. {vm_name} (error getting state)")
-                vm_list.append(vm_name)
+            else:
+                power_state = power_states.get(vm_name, 'poweredOff')
+            
+            print(f"  {i}. {vm_name} ({power_state})")
+            vm_list.append(vm_name)
         
         return vm_list
         
@@ -58,6 +49,23 @@ def list_vms_for_deletion(config, logger, env):
         logger.error(f"Error listing VMs: {e}")
         return []
 
+def get_power_states(config, env):
+    """Map VM name -> power state, or None if the inventory query fails
+    
+    One 'govc find' per non-default state replaces a vm.info call per VM;
+    VMs in neither result are powered off.
+    """
+    states = {}
+    for state in ('poweredOn', 'suspended'):
+        cmd = [config.govc_bin, 'find', '/', '-type', 'm', '-runtime.powerState', state]
+        result = subprocess.run(cmd, env=env, capture_output=True, text=True)
+        if result.returncode != 0:
+            return None
+        for line in map(str.strip, result.stdout.splitlines()):
+            if line:
+                states[line.rsplit('/', 1)[-1]] = state
+    return states
+
 def get_vm_info(config, logger, env, vm_name):
     """Get detailed VM information before deletion"""
     logger.info(f"📊 VM Information: {vm_name}")
@@ -101,68 +109,78 @@ def confirm_deletion(vm_name):
     
     return confirmation == f"DELETE {vm_name}"
 
-def destroy_vm(config, logger, env, vm_name, force=False):
-    """Safely destroy a VM and clean up resources"""
+def destroy_vm(config, logger, env, vm_name, force=False, graceful=False):
+    """Safely destroy a VM and clean up resources
+    
+    vm.destroy powers the VM off and deletes its snapshots along with its
+    disks, so by default it is the only govc call. graceful=True keeps the
+    explicit power-off and snapshot removal steps first. Every message names
+    the VM, since bulk destroys log several VMs at once.
+    """
     logger.info(f"💥 Destroying VM: {vm_name}")
     
     try:
-        # Step 1: Power off VM if running
-        logger.info("Step 1: Powering off VM...")
-        power_cmd = [config.govc_bin, 'vm.power', '-off', vm_name]
-        power_result = subprocess.run(power_cmd, env=env, capture_output=True, text=True)
-        
-        if power_result.returncode == 0:
-            logger.info("✅ VM powered off")
-        else:
-            logger.info("ℹ️  VM was already powered off or not found")
-        
-        # Wait a moment for clean shutdown
-        time.sleep(3)
-        
-        # Step 2: Remove all snapshots
-        logger.info("Step 2: Removing snapshots...")
-        snap_cmd = [config.govc_bin, 'snapshot.remove', '-vm', vm_name, '*']
-        snap_result = subprocess.run(snap_cmd, env=env, capture_output=True, text=True)
-        
-        if snap_result.returncode == 0:
-            logger.info("✅ Snapshots removed")
-        else:
-            logger.info("ℹ️  No snapshots to remove")
+        if graceful:
+            # Power off VM if running
+            logger.info(f"Powering off {vm_name}...")
+            power_cmd = [config.govc_bin, 'vm.power', '-off', vm_name]
+            power_result = subprocess.run(power_cmd, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+            
+            if power_result.returncode == 0:
+                logger.info(f"✅ {vm_name} powered off")
+            else:
+                logger.info(f"ℹ️  {vm_name} was already powered off or not found")
+            
+            # Wait until the power-off has actually landed
+            from modules.govc import wait_power_off
+            wait_power_off(config, env, vm_name)
+            
+            # Remove all snapshots
+            logger.info(f"Removing snapshots of {vm_name}...")
+            snap_cmd = [config.govc_bin, 'snapshot.remove', '-vm', vm_name, '*']
+            snap_result = subprocess.run(snap_cmd, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+            
+            if snap_result.returncode == 0:
+                logger.info(f"✅ Snapshots of {vm_name} removed")
+            else:
+                logger.info(f"ℹ️  No snapshots to remove for {vm_name}")
         
-        # Step 3: Destroy VM
-        logger.info("Step 3: Destroying VM...")
+        # Destroy VM - powers off and drops snapshots if still needed
+        logger.info(f"Destroying {vm_name}...")
         destroy_cmd = [config.govc_bin, 'vm.destroy', vm_name]
-        destroy_result = subprocess.run(destroy_cmd, env=env, capture_output=True, text=True)
+        destroy_result = subprocess.run(destroy_cmd, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True)
         
         if destroy_result.returncode == 0:
-            logger.info("✅ VM destroyed successfully")
+            logger.info(f"✅ {vm_name} destroyed successfully")
             
-            # Step 4: Clean up any remaining files
-            logger.info("Step 4: Cleaning up...")
+            # Clean up any remaining files
+            logger.info(f"Cleaning up after {vm_name}...")
             
             # Try to clean up any cloud-init ISOs with the VM name
             work_dir = config.work_dir
             if os.path.exists(work_dir):
-                for file in os.listdir(work_dir):
-                    if vm_name in file and file.endswith('.iso'):
-                        try:
-                            os.remove(os.path.join(work_dir, file))
-                            logger.info(f"🗑️  Removed: {file}")
-                        except Exception as e:
-                            logger.warn(f"Could not remove {file}: {e}")
+                with os.scandir(work_dir) as entries:
+                    for entry in entries:
+                        name = entry.name
+                        if name.endswith('.iso') and vm_name in name and entry.is_file():
+                            try:
+                                os.remove(entry.path)
+                                logger.info(f"🗑️  Removed: {name}")
+                            except Exception as e:
+                                logger.warn(f"Could not remove {name}: {e}")
             
             logger.info(f"🎉 VM '{vm_name}' completely destroyed!")
             return True
             
         else:
-            logger.error(f"Failed to destroy VM: {destroy_result.stderr}")
+            logger.error(f"Failed to destroy {vm_name}: {destroy_result.stderr}")
             return False
             
     except Exception as e:
-        logger.error(f"Error destroying VM: {e}")
+        logger.error(f"Error destroying {vm_name}: {e}")
         return False
 
-def destroy_multiple_vms(config, logger, env, pattern=None):
+def destroy_multiple_vms(config, logger, env, pattern=None, graceful=False):
     """Destroy multiple VMs matching a pattern"""
     logger.info(f"🔍 Finding VMs to destroy{f' matching pattern: {pattern}' if pattern else ''}...")
     
@@ -170,7 +188,7 @@ def destroy_multiple_vms(config, logger, env, pattern=None):
         cmd = [config.govc_bin, 'ls', '/*/vm/']
         result = subprocess.run(cmd, env=env, capture_output=True, text=True)
         
-        all_vms = [line.strip().split('/')[-1] for line in result.stdout.split('\n') if line.strip()]
+        all_vms = [line.rsplit('/', 1)[-1] for line in map(str.strip, result.stdout.splitlines()) if line]
         
         if pattern:
             matching_vms = [vm for vm in all_vms if pattern in vm]
@@ -188,13 +206,13 @@ def destroy_multiple_vms(config, logger, env, pattern=None):
         confirm = input(f"\nDestroy all {len(matching_vms)} VMs? (yes/no): ").strip().lower()
         
         if confirm == 'yes':
-            destroyed = 0
-            for vm in matching_vms:
-                logger.info(f"\n--- Destroying {vm} ---")
-                if destroy_vm(config, logger, env, vm, force=True):
-                    destroyed += 1
-                else:
-                    logger.error(f"Failed to destroy {vm}")
+            def destroy_one(vm):
+                return destroy_vm(config, logger, env, vm, force=True, graceful=graceful)
+            
+            # The VMs are independent, so destroy them concurrently; Logger
+            # serialises the output line by line and each line names its VM
+            with ThreadPoolExecutor(max_workers=min(8, len(matching_vms))) as executor:
+                destroyed = sum(executor.map(destroy_one, matching_vms))
             
             logger.info(f"\n✅ Destroyed {destroyed}/{len(matching_vms)} VMs")
         else:
@@ -203,16 +221,42 @@ def destroy_multiple_vms(config, logger, env, pattern=None):
     except Exception as e:
         logger.error(f"Error in bulk destruction: {e}")
 
+def print_usage():
+    print("Usage:")
+    print("  python3 destroy_vm.py                    # Interactive mode")
+    print("  python3 destroy_vm.py <vm-name>          # Destroy specific VM")
+    print("  python3 destroy_vm.py --pattern <text>   # Destroy VMs matching pattern")
+    print("  python3 destroy_vm.py --list             # List VMs only")
+    print("")
+    print("Add --graceful to power off and remove snapshots before vm.destroy")
+    print("")
+    print("Examples:")
+    print("  python3 destroy_vm.py ubuntu-pentest-20250704-102906")
+    print("  python3 destroy_vm.py --pattern ubuntu-pentest")
+    print("  python3 destroy_vm.py --list")
+
 def main():
+    # Help needs neither the config nor a govc login
+    if len(sys.argv) > 1 and sys.argv[1] in ('-h', '--help'):
+        print_usage()
+        return
+    
+    # Every other path talks to ESXi, so load the project modules now
+    from modules.config import Config
+    from modules.logger import Logger
+    from modules.govc import persistent_govc_env
+    
     config = Config()
     logger = Logger()
     
-    # Set up environment
-    env = os.environ.copy()
-    env['GOVC_URL'] = f"https://{config.esxi_user}:{config.esxi_password}@{config.esxi_host}/sdk"
-    env['GOVC_INSECURE'] = '1'
+    # --graceful may appear anywhere; the remaining arguments pick the mode
+    graceful = '--graceful' in sys.argv
+    argv = [arg for arg in sys.argv if arg != '--graceful']
+    
+    # Set up environment - one govc login shared by every command below
+    env = persistent_govc_env(config)
     
-    if len(sys.argv) == 1:
+    if len(argv) == 1:
         # Interactive mode
         logger.info("🗑️  VM Destruction Tool")
         print("=" * 50)
@@ -237,13 +281,13 @@ def main():
             logger.warn("⚠️  WARNING: This will destroy ALL VMs!")
             final_confirm = input("Type 'DESTROY ALL VMs' to confirm: ").strip()
             if final_confirm == "DESTROY ALL VMs":
-                destroy_multiple_vms(config, logger, env)
+                destroy_multiple_vms(config, logger, env, graceful=graceful)
             else:
                 logger.info("Cancelled")
         elif choice.startswith('pattern:'):
             pattern = choice[8:].strip()
             if pattern:
-                destroy_multiple_vms(config, logger, env, pattern)
+                destroy_multiple_vms(config, logger, env, pattern, graceful=graceful)
             else:
                 logger.error("No pattern specified")
         else:
@@ -257,7 +301,7 @@ def main():
                     
                     # Confirm deletion
                     if confirm_deletion(vm_name):
-                        destroy_vm(config, logger, env, vm_name)
+                        destroy_vm(config, logger, env, vm_name, graceful=graceful)
                     else:
                         logger.info("Deletion cancelled")
                 else:
@@ -267,35 +311,22 @@ def main():
     
     else:
         # Command line mode
-        if len(sys.argv) < 2:
-            print("Usage:")
-            print("  python3 destroy_vm.py                    # Interactive mode")
-            print("  python3 destroy_vm.py <vm-name>          # Destroy specific VM")
-            print("  python3 destroy_vm.py --pattern <text>   # Destroy VMs matching pattern")
-            print("  python3 destroy_vm.py --list             # List VMs only")
-            print("")
-            print("Examples:")
-            print("  python3 destroy_vm.py ubuntu-pentest-20250704-102906")
-            print("  python3 destroy_vm.py --pattern ubuntu-pentest")
-            print("  python3 destroy_vm.py --list")
-            sys.exit(1)
-        
-        if sys.argv[1] == '--list':
+        if argv[1] == '--list':
             list_vms_for_deletion(config, logger, env)
-        elif sys.argv[1] == '--pattern':
-            if len(sys.argv) > 2:
-                pattern = sys.argv[2]
-                destroy_multiple_vms(config, logger, env, pattern)
+        elif argv[1] == '--pattern':
+            if len(argv) > 2:
+                pattern = argv[2]
+                destroy_multiple_vms(config, logger, env, pattern, graceful=graceful)
             else:
                 logger.error("Pattern not specified")
         else:
-            vm_name = sys.argv[1]
+            vm_name = argv[1]
             
             # Show VM info
             if get_vm_info(config, logger, env, vm_name):
                 # Confirm deletion
                 if confirm_deletion(vm_name):
-                    destroy_vm(config, logger, env, vm_name)
+                    destroy_vm(config, logger, env, vm_name, graceful=graceful)
                 else:
                     logger.info("Deletion cancelled")
 
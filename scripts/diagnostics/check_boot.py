@@ -7,18 +7,17 @@ import sys
 import os
 sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..'))
 
-from modules.config import Config
-from modules.logger import Logger
+from modules.config import get_config
+from modules.logger import get_logger
+from modules.govc import get_govc_env, wait_power_off
 import subprocess
 
 def check_boot_order(vm_name):
-    config = Config()
-    logger = Logger()
+    config = get_config()
+    logger = get_logger()
     
     # Set govc environment
-    env = os.environ.copy()
-    env['GOVC_URL'] = f"https://{config.esxi_user}:{config.esxi_password}@{config.esxi_host}/sdk"
-    env['GOVC_INSECURE'] = '1'
+    env = get_govc_env()
     
     logger.info(f"🔍 Checking boot configuration for: {vm_name}")
     
@@ -27,7 +26,8 @@ def check_boot_order(vm_name):
         logger.info("=== All VM Devices ===")
         cmd = [config.govc_bin, 'device.ls', '-vm', vm_name]
         result = subprocess.run(cmd, env=env, capture_output=True, text=True)
-        print(result.stdout)
+        devices_output = result.stdout
+        print(devices_output)
         
         # Check CD-ROM specifically
         logger.info("=== CD-ROM Device Info ===")
@@ -38,14 +38,12 @@ def check_boot_order(vm_name):
         else:
             logger.warn("No CD-ROM device found!")
             
-        # Check if ISO is actually attached
-        devices_output = subprocess.run([config.govc_bin, 'device.ls', '-vm', vm_name], 
-                                      env=env, capture_output=True, text=True).stdout
-        
-        if 'cdrom' in devices_output.lower():
+        # Check if ISO is actually attached, using the device list from above
+        devices_lower = devices_output.lower()
+        if 'cdrom' in devices_lower:
             logger.info("✅ CD-ROM device exists")
             # Check if it has our ISO
-            if 'cloud-init.iso' in devices_output:
+            if 'cloud-init.iso' in devices_lower:
                 logger.info("✅ Cloud-init ISO is attached")
             else:
                 logger.warn("❌ Cloud-init ISO not attached or different file")
@@ -66,12 +64,10 @@ def check_boot_order(vm_name):
         logger.error(f"Error: {e}")
 
 def force_cdrom_boot(vm_name):
-    config = Config()
-    logger = Logger()
+    config = get_config()
+    logger = get_logger()
     
-    env = os.environ.copy()
-    env['GOVC_URL'] = f"https://{config.esxi_user}:{config.esxi_password}@{config.esxi_host}/sdk"
-    env['GOVC_INSECURE'] = '1'
+    env = get_govc_env()
     
     logger.info("🔧 Attempting to force CD-ROM boot...")
     
@@ -79,10 +75,9 @@ def force_cdrom_boot(vm_name):
         # Power off VM
         logger.info("Powering off VM...")
         cmd = [config.govc_bin, 'vm.power', '-off', vm_name]
-        subprocess.run(cmd, env=env, capture_output=True, text=True)
+        subprocess.run(cmd, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
         
-        import time
-        time.sleep(5)
+        wait_power_off(config, env, vm_name)
         
         # Try to set boot order via device.boot
         logger.info("Attempting to set boot order...")
@@ -98,7 +93,7 @@ def force_cdrom_boot(vm_name):
         # Power back on
         logger.info("Powering on VM...")
         cmd = [config.govc_bin, 'vm.power', '-on', vm_name]
-        subprocess.run(cmd, env=env, capture_output=True, text=True)
+        subprocess.run(cmd, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
         
         logger.info("✅ VM powered on - should boot from CD-ROM now")
         
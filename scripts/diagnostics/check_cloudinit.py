@@ -8,20 +8,24 @@ import sys
 import os
 sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..'))
 
-from modules.config import Config
-from modules.logger import Logger
+from modules.config import get_config
+from modules.logger import get_logger
+from modules.govc import get_govc_env
+from modules.ssh import SSH_PASSWORD, ssh_base, sshpass_available, start_ssh_master, stop_ssh_master
+import re
 import subprocess
 import time
 
+# First state word in 'cloud-init status' output
+_STATUS_RE = re.compile(r'\b(done|running|error|disabled)\b')
+
 def check_cloud_init_logs(vm_name, follow=False):
     """Check cloud-init logs via SSH or guest tools"""
-    config = Config()
-    logger = Logger()
+    config = get_config()
+    logger = get_logger()
     
-    # Set govc environment
-    env = os.environ.copy()
-    env['GOVC_URL'] = f"https://{config.esxi_user}:{config.esxi_password}@{config.esxi_host}/sdk"
-    env['GOVC_INSECURE'] = '1'
+    # Set govc environment - one login shared by every govc call
+    env = get_govc_env()
     
     logger.info(f"📋 Checking cloud-init logs for: {vm_name}")
     
@@ -30,7 +34,10 @@ def check_cloud_init_logs(vm_name, follow=False):
         vm_ip = get_vm_ip(config, logger, env, vm_name)
         
         if vm_ip:
-            check_logs_via_ssh(config, logger, vm_ip, follow)
+            try:
+                check_logs_via_ssh(config, logger, vm_ip, follow)
+            finally:
+                stop_ssh_master(vm_ip)
         else:
             logger.warn("No IP address - cannot check logs via SSH")
             logger.info("Try checking manually via ESXi console")
@@ -38,8 +45,15 @@ def check_cloud_init_logs(vm_name, follow=False):
     except Exception as e:
         logger.error(f"Error checking logs: {e}")
 
-def get_vm_ip(config, logger, env, vm_name):
-    """Get VM IP address"""
+# VM name -> IP found by get_vm_ip; misses are not cached so a later call
+# can still pick up a late DHCP lease
+_vm_ips = {}
+
+def get_vm_ip(config, logger, env, vm_name, refresh=False):
+    """Get VM IP address, reusing an earlier lookup unless refresh is set"""
+    if not refresh and vm_name in _vm_ips:
+        return _vm_ips[vm_name]
+    
     logger.info("Getting VM IP address...")
     
     cmd = [config.govc_bin, 'vm.ip', vm_name]
@@ -49,6 +63,7 @@ def get_vm_ip(config, logger, env, vm_name):
         ip = result.stdout.strip()
         if ip and ip != "0.0.0.0":
             logger.info(f"✅ VM IP: {ip}")
+            _vm_ips[vm_name] = ip
             return ip
     
     return None
@@ -57,69 +72,53 @@ def check_logs_via_ssh(config, logger, vm_ip, follow):
     """Check cloud-init logs via SSH"""
     logger.info(f"Connecting to ubuntu@{vm_ip} to check cloud-init...")
     
-    # Test SSH connectivity first
-    ssh_cmd = [
-        'ssh', '-o', 'ConnectTimeout=5', 
-        '-o', 'StrictHostKeyChecking=no',
-        '-o', 'BatchMode=yes',
-        f'ubuntu@{vm_ip}', 'echo "SSH OK"'
-    ]
-    
-    result = subprocess.run(ssh_cmd, capture_output=True, text=True)
-    
-    if result.returncode != 0:
+    # Test SSH by opening the master connection the log reads will share
+    if not start_ssh_master(vm_ip):
         logger.warn("SSH connection failed - trying with password...")
         check_logs_with_password(config, logger, vm_ip, follow)
         return
     
     logger.info("✅ SSH connection successful")
+    base = ssh_base(vm_ip)
     
     # Check cloud-init status
     logger.info("=== Cloud-Init Status ===")
-    ssh_cmd = [
-        'ssh', '-o', 'ConnectTimeout=5', 
-        '-o', 'StrictHostKeyChecking=no',
-        f'ubuntu@{vm_ip}', 'sudo cloud-init status --long'
-    ]
+    ssh_cmd = base + ['sudo cloud-init status --long']
     result = subprocess.run(ssh_cmd, capture_output=True, text=True)
     print(result.stdout)
     
     # Check cloud-init logs
     logger.info("=== Cloud-Init Log (last 50 lines) ===")
-    ssh_cmd = [
-        'ssh', '-o', 'ConnectTimeout=5', 
-        '-o', 'StrictHostKeyChecking=no',
-        f'ubuntu@{vm_ip}', 'sudo tail -50 /var/log/cloud-init.log'
-    ]
+    ssh_cmd = base + ['sudo tail -50 /var/log/cloud-init.log']
     result = subprocess.run(ssh_cmd, capture_output=True, text=True)
     print(result.stdout)
     
     # Check cloud-init output log
     logger.info("=== Cloud-Init Output Log (last 30 lines) ===")
-    ssh_cmd = [
-        'ssh', '-o', 'ConnectTimeout=5', 
-        '-o', 'StrictHostKeyChecking=no',
-        f'ubuntu@{vm_ip}', 'sudo tail -30 /var/log/cloud-init-output.log'
-    ]
+    ssh_cmd = base + ['sudo tail -30 /var/log/cloud-init-output.log']
     result = subprocess.run(ssh_cmd, capture_output=True, text=True)
     print(result.stdout)
     
     if follow:
         logger.info("=== Following Cloud-Init Log (Ctrl+C to stop) ===")
+        # -tt gives tail a terminal so it flushes each line, and reading
+        # the pipe line by line passes them straight through
+        ssh_cmd = [base[0], '-tt', *base[1:], 'sudo tail -f /var/log/cloud-init-output.log']
+        proc = subprocess.Popen(ssh_cmd, stdout=subprocess.PIPE, bufsize=1, text=True)
         try:
-            ssh_cmd = [
-                'ssh', '-o', 'ConnectTimeout=5', 
-                '-o', 'StrictHostKeyChecking=no',
-                f'ubuntu@{vm_ip}', 'sudo tail -f /var/log/cloud-init-output.log'
-            ]
-            subprocess.run(ssh_cmd)
+            for line in proc.stdout:
+                sys.stdout.write(line)
+                sys.stdout.flush()
         except KeyboardInterrupt:
+            proc.terminate()
             logger.info("Stopped following log")
+        finally:
+            proc.wait()
 
 def check_logs_with_password(config, logger, vm_ip, follow):
     """Try to check logs using password authentication"""
     
-    if not check_sshpass():
+    if not sshpass_available():
         logger.warn("sshpass not available - install with: brew install hudochenkov/sshpass/sshpass")
         logger.info("Manual check:")
         logger.info(f"ssh ubuntu@{vm_ip}")
@@ -130,44 +129,32 @@ def check_logs_with_password(config, logger, vm_ip, follow):
     
     logger.info("Trying SSH with password...")
     
+    # Authenticate once; the log reads then ride the master connection,
+    # or each pass the password themselves if it could not be opened
+    if start_ssh_master(vm_ip, SSH_PASSWORD):
+        base = ssh_base(vm_ip)
+    else:
+        base = ['sshpass', '-p', SSH_PASSWORD] + ssh_base(vm_ip)
+    
     # Check cloud-init status with password
     logger.info("=== Cloud-Init Status ===")
-    ssh_cmd = [
-        'sshpass', '-p', 'ubuntu', 'ssh', 
-        '-o', 'ConnectTimeout=5', 
-        '-o', 'StrictHostKeyChecking=no',
-        f'ubuntu@{vm_ip}', 'sudo cloud-init status --long'
-    ]
+    ssh_cmd = base + ['sudo cloud-init status --long']
     result = subprocess.run(ssh_cmd, capture_output=True, text=True)
     print(result.stdout)
     
     # Check cloud-init logs with password
     logger.info("=== Cloud-Init Log (last 50 lines) ===")
-    ssh_cmd = [
-        'sshpass', '-p', 'ubuntu', 'ssh', 
-        '-o', 'ConnectTimeout=5', 
-        '-o', 'StrictHostKeyChecking=no',
-        f'ubuntu@{vm_ip}', 'sudo tail -50 /var/log/cloud-init.log'
-    ]
+    ssh_cmd = base + ['sudo tail -50 /var/log/cloud-init.log']
     result = subprocess.run(ssh_cmd, capture_output=True, text=True)
     print(result.stdout)
 
-def check_sshpass():
-    """Check if sshpass is available"""
-    try:
-        subprocess.run(['sshpass'], capture_output=True)
-        return True
-    except FileNotFoundError:
-        return False
-
 def check_cloud_init_progress(vm_name):
     """Quick check of cloud-init progress"""
-    config = Config()
-    logger = Logger()
+    config = get_config()
+    logger = get_logger()
     
-    env = os.environ.copy()
-    env['GOVC_URL'] = f"https://{config.esxi_user}:{config.esxi_password}@{config.esxi_host}/sdk"
-    env['GOVC_INSECURE'] = '1'
+    # Set govc environment - one login shared by every govc call
+    env = get_govc_env()
     
     logger.info(f"🔍 Quick cloud-init progress check: {vm_name}")
     
@@ -178,30 +165,22 @@ def check_cloud_init_progress(vm_name):
         return
     
     # Quick status check
-    if check_sshpass():
-        ssh_cmd = [
-            'sshpass', '-p', 'ubuntu', 'ssh', 
-            '-o', 'ConnectTimeout=5', 
-            '-o', 'StrictHostKeyChecking=no',
-            f'ubuntu@{vm_ip}', 'sudo cloud-init status'
-        ]
+    if sshpass_available():
+        ssh_cmd = ['sshpass', '-p', SSH_PASSWORD] + ssh_base(vm_ip) + ['sudo cloud-init status']
     else:
-        ssh_cmd = [
-            'ssh', '-o', 'ConnectTimeout=5', 
-            '-o', 'StrictHostKeyChecking=no',
-            '-o', 'BatchMode=yes',
-            f'ubuntu@{vm_ip}', 'sudo cloud-init status'
-        ]
+        ssh_cmd = ssh_base(vm_ip, batch_mode=True) + ['sudo cloud-init status']
     
     result = subprocess.run(ssh_cmd, capture_output=True, text=True)
     
     if result.returncode == 0:
         status = result.stdout.strip()
-        if 'done' in status:
+        match = _STATUS_RE.search(status)
+        state = match.group(1) if match else None
+        if state == 'done':
             logger.info("✅ Cloud-init completed successfully")
-        elif 'running' in status:
+        elif state == 'running':
             logger.info("🔄 Cloud-init is still running...")
-        elif 'error' in status:
+        elif state == 'error':
             logger.warn("❌ Cloud-init encountered errors")
         else:
             logger.info(f"Status: {status}")
@@ -8,26 +8,28 @@ import sys
 import os
 sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..'))
 
-from modules.config import Config
-from modules.logger import Logger
+from modules.config import get_config
+from modules.logger import get_logger
+from modules.govc import get_govc_env
 import subprocess
+from concurrent.futures import ThreadPoolExecutor
 
 def main():
-    config = Config()
-    logger = Logger()
+    config = get_config()
+    logger = get_logger()
     
-    # Set govc environment
-    env = os.environ.copy()
-    env['GOVC_URL'] = f"https://{config.esxi_user}:{config.esxi_password}@{config.esxi_host}/sdk"
-    env['GOVC_INSECURE'] = '1'
+    # Set govc environment - one login shared by every govc call
+    env = get_govc_env()
     
     logger.info("Checking VM status...")
     
     # Find the latest VM
     try:
-        cmd = [config.govc_bin, 'ls', '/*/vm/']
+        # Let ESXi match the name so only deployed VMs come back; names end
+        # in a timestamp, so sorting puts the newest last
+        cmd = [config.govc_bin, 'find', '/', '-type', 'm', '-name', 'ubuntu-pentest*']
         result = subprocess.run(cmd, env=env, capture_output=True, text=True)
-        vms = [line for line in result.stdout.split('\n') if 'ubuntu-pentest' in line]
+        vms = sorted(line for line in result.stdout.splitlines() if line)
         
         if not vms:
             logger.error("No ubuntu-pentest VMs found")
@@ -36,21 +38,26 @@ def main():
         latest_vm = vms[-1].split('/')[-1]
         logger.info(f"Found VM: {latest_vm}")
         
-        # Check power state
-        cmd = [config.govc_bin, 'vm.info', '-json', latest_vm]
-        result = subprocess.run(cmd, env=env, capture_output=True, text=True)
+        # The power state, IP and details queries are independent - run
+        # them together
+        commands = [
+            [config.govc_bin, 'vm.info', '-json', latest_vm],
+            [config.govc_bin, 'vm.ip', latest_vm],
+            [config.govc_bin, 'vm.info', latest_vm],
+        ]
+        with ThreadPoolExecutor(max_workers=len(commands)) as executor:
+            json_result, ip_result, info_result = executor.map(
+                lambda cmd: subprocess.run(cmd, env=env, capture_output=True, text=True), commands)
         
-        if 'poweredOn' in result.stdout:
+        # Check power state
+        if 'poweredOn' in json_result.stdout:
             logger.info("✅ VM is powered on")
         else:
             logger.warn("❌ VM is not powered on")
             
         # Check IP
-        cmd = [config.govc_bin, 'vm.ip', latest_vm]
-        result = subprocess.run(cmd, env=env, capture_output=True, text=True)
-        
-        if result.returncode == 0 and result.stdout.strip():
-            ip = result.stdout.strip()
+        if ip_result.returncode == 0 and ip_result.stdout.strip():
+            ip = ip_result.stdout.strip()
             if ip != "0.0.0.0":
                 logger.info(f"✅ VM IP: {ip}")
             else:
@@ -59,10 +66,8 @@ def main():
             logger.warn("❌ Could not get VM IP")
             
         # Show VM info
-        cmd = [config.govc_bin, 'vm.info', latest_vm]
-        result = subprocess.run(cmd, env=env, capture_output=True, text=True)
         logger.status("\nVM Details:")
-        print(result.stdout)
+        print(info_result.stdout)
         
     except Exception as e:
         logger.error(f"Error checking VM: {e}")
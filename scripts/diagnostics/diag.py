@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+"""
+Diagnostics Launcher
+Run any diagnostic from one process, sharing the config, govc login and
+SSH connections between every VM checked
+"""
+
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import argparse
+
+import check_boot
+import check_cloudinit
+import check_vm
+import diagnose_vm
+import network_check
+import quick_status
+
+def status_cmd(args):
+    vm_names = quick_status.find_all_vms() if args.all else args.vm_names
+    quick_status.quick_statuses(vm_names)
+
+def network_cmd(args):
+    for vm_name in args.vm_names:
+        network_check.check_network(vm_name)
+
+def diagnose_cmd(args):
+    for vm_name in args.vm_names:
+        diagnose_vm.diagnose_vm(vm_name)
+
+def cloudinit_cmd(args):
+    for vm_name in args.vm_names:
+        if args.mode == 'progress':
+            check_cloudinit.check_cloud_init_progress(vm_name)
+        else:
+            check_cloudinit.check_cloud_init_logs(vm_name, follow=args.mode == 'follow')
+
+def check_cmd(args):
+    check_vm.main()
+
+def boot_cmd(args):
+    for vm_name in args.vm_names:
+        if args.force:
+            check_boot.force_cdrom_boot(vm_name)
+        else:
+            check_boot.check_boot_order(vm_name)
+
+def build_parser():
+    parser = argparse.ArgumentParser(
+        prog='diag.py',
+        description="VM diagnostics - one process, one govc login for every VM"
+    )
+    commands = parser.add_subparsers(dest='command', metavar='<command>')
+    commands.required = True
+    
+    status = commands.add_parser('status', help="Quick power state and IP check")
+    status.add_argument('vm_names', nargs='*', metavar='vm-name')
+    status.add_argument('--all', action='store_true', help="Check every VM on the host")
+    status.set_defaults(func=status_cmd)
+    
+    network = commands.add_parser('network', help="Network diagnostics (connects the NIC)")
+    network.add_argument('vm_names', nargs='+', metavar='vm-name')
+    network.set_defaults(func=network_cmd)
+    
+    diagnose = commands.add_parser('diagnose', help="Full VM diagnostics")
+    diagnose.add_argument('vm_names', nargs='+', metavar='vm-name')
+    diagnose.set_defaults(func=diagnose_cmd)
+    
+    cloudinit = commands.add_parser('cloudinit', help="Cloud-init logs and progress")
+    cloudinit.add_argument('vm_names', nargs='+', metavar='vm-name')
+    cloudinit.add_argument('--mode', choices=('logs', 'follow', 'progress'), default='logs')
+    cloudinit.set_defaults(func=cloudinit_cmd)
+    
+    check = commands.add_parser('check', help="Status of the newest ubuntu-pentest VM")
+    check.set_defaults(func=check_cmd)
+    
+    boot = commands.add_parser('boot', help="Boot order and CD-ROM status")
+    boot.add_argument('vm_names', nargs='+', metavar='vm-name')
+    boot.add_argument('--force', action='store_true', help="Force CD-ROM boot order")
+    boot.set_defaults(func=boot_cmd)
+    
+    return parser
+
+def main(argv=None):
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    
+    if args.command == 'status' and not (args.all or args.vm_names):
+        parser.error("status needs a vm-name or --all")
+    
+    args.func(args)
+
+if __name__ == "__main__":
+    main()
@@ -7,95 +7,128 @@ import sys
 import os
 sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..'))
 
-from modules.config import Config
-from modules.logger import Logger
+from modules.config import get_config
+from modules.logger import get_logger
+from modules.govc import get_govc_env, json_field, json_loads
 import subprocess
+from concurrent.futures import ThreadPoolExecutor
 
 def diagnose_vm(vm_name):
-    config = Config()
-    logger = Logger()
+    config = get_config()
+    logger = get_logger()
     
-    # Set govc environment
-    env = os.environ.copy()
-    env['GOVC_URL'] = f"https://{config.esxi_user}:{config.esxi_password}@{config.esxi_host}/sdk"
-    env['GOVC_INSECURE'] = '1'
+    # Set govc environment - one login shared by every govc call
+    env = get_govc_env()
     
     logger.info(f"🔍 Diagnosing VM: {vm_name}")
     
+    # Every query is independent, so start them all at once and print the
+    # results in order below - (label, command, timeout)
+    queries = [
+        ('info', [config.govc_bin, 'vm.info', vm_name], None),
+        ('json', [config.govc_bin, 'vm.info', '-json', vm_name], None),
+        ('devices', [config.govc_bin, 'device.ls', '-vm', vm_name], None),
+        ('device_info', [config.govc_bin, 'device.info', '-vm', vm_name, 'ethernet-*', 'cdrom-*'], None),
+        ('events', [config.govc_bin, 'events', '-n', '10', vm_name], None),
+        ('datastore', [config.govc_bin, 'datastore.info', config.datastore], None),
+        ('console', [config.govc_bin, 'vm.console', vm_name], 5),
+    ]
+    
     try:
-        # 1. Check VM power state and basic info
-        logger.info("=== VM Basic Info ===")
-        cmd = [config.govc_bin, 'vm.info', vm_name]
-        result = subprocess.run(cmd, env=env, capture_output=True, text=True)
-        print(result.stdout)
-        
-        # 2. Check VM hardware configuration
-        logger.info("=== VM Hardware ===")
-        cmd = [config.govc_bin, 'vm.info', '-json', vm_name]
-        result = subprocess.run(cmd, env=env, capture_output=True, text=True)
-        if 'numCpu' in result.stdout:
-            import json
-            vm_data = json.loads(result.stdout)
-            vm_info = vm_data['VirtualMachines'][0]
-            logger.info(f"CPUs: {vm_info['Config']['Hardware']['NumCPU']}")
-            logger.info(f"Memory: {vm_info['Config']['Hardware']['MemoryMB']} MB")
-        
-        # 3. Check network devices
-        logger.info("=== Network Devices ===")
-        cmd = [config.govc_bin, 'device.ls', '-vm', vm_name]
-        result = subprocess.run(cmd, env=env, capture_output=True, text=True)
-        print(result.stdout)
-        
-        # 4. Check network adapter details
-        logger.info("=== Network Adapter Details ===")
-        cmd = [config.govc_bin, 'device.info', '-vm', vm_name, 'ethernet-*']
-        result = subprocess.run(cmd, env=env, capture_output=True, text=True)
-        print(result.stdout)
-        
-        # 5. Check VM events for errors
-        logger.info("=== Recent VM Events ===")
-        cmd = [config.govc_bin, 'events', '-n', '10', vm_name]
-        result = subprocess.run(cmd, env=env, capture_output=True, text=True)
-        print(result.stdout)
-        
-        # 6. Check datastore info
-        logger.info("=== Datastore Info ===")
-        cmd = [config.govc_bin, 'datastore.info', config.datastore]
-        result = subprocess.run(cmd, env=env, capture_output=True, text=True)
-        print(result.stdout)
-        
-        # 7. Check if cloud-init ISO is attached
-        logger.info("=== CD-ROM Devices ===")
-        cmd = [config.govc_bin, 'device.info', '-vm', vm_name, 'cdrom-*']
-        result = subprocess.run(cmd, env=env, capture_output=True, text=True)
-        print(result.stdout)
-        
-        # 8. Try to get VM IP with timeout
-        logger.info("=== IP Address Check ===")
-        cmd = [config.govc_bin, 'vm.ip', vm_name]
-        result = subprocess.run(cmd, env=env, capture_output=True, text=True, timeout=10)
-        if result.returncode == 0 and result.stdout.strip():
-            ip = result.stdout.strip()
-            logger.info(f"VM IP: {ip}")
-            if ip == "0.0.0.0":
-                logger.warn("IP is 0.0.0.0 - VM not getting DHCP")
-        else:
-            logger.warn("No IP address found")
+        with ThreadPoolExecutor(max_workers=len(queries)) as executor:
+            results = {
+                # vm.info -json stays bytes for the JSON parser
+                label: executor.submit(subprocess.run, cmd, env=env, capture_output=True, text=label != 'json', timeout=timeout)
+                for label, cmd, timeout in queries
+            }
+            
+            # 1. Check VM power state and basic info
+            logger.info("=== VM Basic Info ===")
+            result = results['info'].result()
+            print(result.stdout)
+            
+            # 2. Check VM hardware configuration
+            logger.info("=== VM Hardware ===")
+            result = results['json'].result()
+            vm_info = None
+            if result.returncode == 0:
+                vm_info = json_field(json_loads(result.stdout), 'VirtualMachines', 0)
+            hardware = json_field(vm_info, 'Config', 'Hardware')
+            if hardware:
+                logger.info(f"CPUs: {json_field(hardware, 'NumCPU')}")
+                logger.info(f"Memory: {json_field(hardware, 'MemoryMB')} MB")
+            
+            # 3. Check network devices
+            logger.info("=== Network Devices ===")
+            result = results['devices'].result()
+            print(result.stdout)
+            
+            # 4. Check network adapter details - one device.info covers the
+            # network adapters and the CD-ROMs
+            logger.info("=== Network Adapter Details ===")
+            device_info = split_device_info(config, env, vm_name, results['device_info'].result())
+            print(device_info['ethernet'])
+            
+            # 5. Check VM events for errors
+            logger.info("=== Recent VM Events ===")
+            result = results['events'].result()
+            print(result.stdout)
+            
+            # 6. Check datastore info
+            logger.info("=== Datastore Info ===")
+            result = results['datastore'].result()
+            print(result.stdout)
             
-        # 9. Check VM console for boot messages
-        logger.info("=== VM Console Check ===")
-        logger.info("Attempting to capture console output...")
-        cmd = [config.govc_bin, 'vm.console', vm_name]
-        result = subprocess.run(cmd, env=env, capture_output=True, text=True, timeout=5)
-        if result.stdout:
-            print("Console output:")
-            print(result.stdout[-1000:])  # Last 1000 chars
-        
+            # 7. Check if cloud-init ISO is attached
+            logger.info("=== CD-ROM Devices ===")
+            print(device_info['cdrom'])
+            
+            # 8. VM IP, as reported by the guest in the JSON from step 2
+            logger.info("=== IP Address Check ===")
+            ip = json_field(vm_info, 'Guest', 'IpAddress')
+            if ip:
+                logger.info(f"VM IP: {ip}")
+                if ip == "0.0.0.0":
+                    logger.warn("IP is 0.0.0.0 - VM not getting DHCP")
+            else:
+                logger.warn("No IP address found")
+            
+            # 9. Check VM console for boot messages
+            logger.info("=== VM Console Check ===")
+            logger.info("Attempting to capture console output...")
+            result = results['console'].result()
+            if result.stdout:
+                print("Console output:")
+                print(result.stdout[-1000:])  # Last 1000 chars
+    
     except subprocess.TimeoutExpired:
         logger.warn("Command timed out")
     except Exception as e:
         logger.error(f"Diagnostic error: {e}")
 
+def split_device_info(config, env, vm_name, result):
+    """Split a combined 'device.info ethernet-* cdrom-*' listing by device type
+    
+    govc fails the whole listing if either pattern matches nothing, so in
+    that case each type is queried on its own.
+    """
+    if result.returncode != 0:
+        sections = {}
+        for prefix in ('ethernet', 'cdrom'):
+            cmd = [config.govc_bin, 'device.info', '-vm', vm_name, f'{prefix}-*']
+            sections[prefix] = subprocess.run(cmd, env=env, capture_output=True, text=True).stdout
+        return sections
+    
+    sections = {'ethernet': [], 'cdrom': []}
+    block = None
+    for line in result.stdout.splitlines(keepends=True):
+        if line.startswith('Name:'):
+            name = line[5:].strip()
+            block = sections['cdrom'] if name.startswith('cdrom-') else sections['ethernet']
+        if block is not None:
+            block.append(line)
+    return {prefix: ''.join(lines) for prefix, lines in sections.items()}
+
 def main():
     if len(sys.argv) != 2:
         print("Usage: python3 diagnose_vm.py <vm-name>")
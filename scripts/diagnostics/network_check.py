@@ -7,47 +7,51 @@ import sys
 import os
 sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..'))
 
-from modules.config import Config
-from modules.logger import Logger
+from modules.config import get_config
+from modules.logger import get_logger
+from modules.govc import get_govc_env, json_field, json_loads
 import subprocess
+from concurrent.futures import ThreadPoolExecutor
 
 def check_network(vm_name):
-    config = Config()
-    logger = Logger()
+    config = get_config()
+    logger = get_logger()
     
-    # Set govc environment
-    env = os.environ.copy()
-    env['GOVC_URL'] = f"https://{config.esxi_user}:{config.esxi_password}@{config.esxi_host}/sdk"
-    env['GOVC_INSECURE'] = '1'
+    # Set govc environment - one login shared by every govc call
+    env = get_govc_env()
     
     logger.info(f"🔍 Network Diagnostic for: {vm_name}")
     
     try:
+        # The read-only queries ahead of the network connect are independent,
+        # so run them together
+        commands = [
+            [config.govc_bin, 'device.ls', '-vm', vm_name],
+            [config.govc_bin, 'device.info', '-vm', vm_name, 'ethernet-0'],
+            [config.govc_bin, 'vm.info', vm_name],
+            [config.govc_bin, 'vm.info', '-json', vm_name],
+        ]
+        with ThreadPoolExecutor(max_workers=len(commands)) as executor:
+            devices_result, ethernet_result, info_result, json_result = executor.map(
+                lambda cmd: subprocess.run(cmd, env=env, capture_output=True), commands)
+        
         # Check network devices
         logger.info("=== Network Devices ===")
-        cmd = [config.govc_bin, 'device.ls', '-vm', vm_name]
-        result = subprocess.run(cmd, env=env, capture_output=True, text=True)
-        print(result.stdout)
+        print(devices_result.stdout.decode('utf-8', 'replace'))
         
         # Check if network is connected
         logger.info("=== Network Connection Status ===")
-        cmd = [config.govc_bin, 'device.info', '-vm', vm_name, 'ethernet-0']
-        result = subprocess.run(cmd, env=env, capture_output=True, text=True)
-        print(result.stdout)
+        print(ethernet_result.stdout.decode('utf-8', 'replace'))
         
         # Check VM tools status
         logger.info("=== VMware Tools Status ===")
-        cmd = [config.govc_bin, 'vm.info', vm_name]
-        result = subprocess.run(cmd, env=env, capture_output=True, text=True)
-        for line in result.stdout.split('\n'):
+        for line in info_result.stdout.decode('utf-8', 'replace').split('\n'):
             if 'Tools' in line or 'Guest' in line:
                 print(line)
         
         # Try to get guest info
         logger.info("=== Guest OS Info ===")
-        cmd = [config.govc_bin, 'vm.info', '-json', vm_name]
-        result = subprocess.run(cmd, env=env, capture_output=True, text=True)
-        if 'guestFullName' in result.stdout:
+        if guest_full_name(json_result):
             print("Guest OS detected")
         else:
             print("Guest OS not detected - VMware Tools may not be running")
@@ -90,6 +94,16 @@ def check_network(vm_name):
     except Exception as e:
         logger.error(f"Error: {e}")
 
+def guest_full_name(result):
+    """Guest OS name from 'vm.info -json' output, or None if not reported"""
+    if result.returncode != 0:
+        return None
+    try:
+        data = json_loads(result.stdout)
+    except ValueError:
+        return None
+    return json_field(data, 'VirtualMachines', 0, 'Guest', 'GuestFullName') or None
+
 def main():
     if len(sys.argv) != 2:
         print("Usage: python3 network_check.py <vm-name>")
@@ -7,58 +7,94 @@ import sys
 import os
 sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..'))
 
-from modules.config import Config
-from modules.logger import Logger
+from modules.config import get_config
+from modules.logger import get_logger
+from modules.govc import get_govc_env, json_field, json_loads
+import asyncio
 import subprocess
 
-def quick_status(vm_name):
-    config = Config()
-    logger = Logger()
+async def fetch_status(config, env, vm_name, timeout=10):
+    """Run 'vm.info -json' without blocking the event loop, returning (exit code, stdout)"""
+    cmd = [config.govc_bin, 'vm.info', '-json', vm_name]
+    proc = await asyncio.create_subprocess_exec(
+        *cmd, env=env,
+        stdin=asyncio.subprocess.DEVNULL, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.DEVNULL
+    )
+    try:
+        stdout, _ = await asyncio.wait_for(proc.communicate(), timeout)
+    except asyncio.TimeoutError:
+        proc.kill()
+        await proc.wait()
+        raise subprocess.TimeoutExpired(cmd, timeout)
+    return proc.returncode, stdout
+
+async def fetch_statuses(config, env, vm_names):
+    return await asyncio.gather(*(fetch_status(config, env, vm_name) for vm_name in vm_names), return_exceptions=True)
+
+def quick_statuses(vm_names):
+    """Query several VMs concurrently, then print each status in order"""
+    config = get_config()
+    logger = get_logger()
     
-    # Set govc environment
-    env = os.environ.copy()
-    env['GOVC_URL'] = f"https://{config.esxi_user}:{config.esxi_password}@{config.esxi_host}/sdk"
-    env['GOVC_INSECURE'] = '1'
+    # Set govc environment - one login shared by every govc call
+    env = get_govc_env()
     
+    results = asyncio.run(fetch_statuses(config, env, vm_names))
+    for vm_name, result in zip(vm_names, results):
+        print_status(logger, vm_name, result)
+
+def quick_status(vm_name):
+    quick_statuses([vm_name])
+
+def print_status(logger, vm_name, result):
+    """Log one VM's power state and IP from its fetch_status result"""
     logger.info(f"📊 Quick Status: {vm_name}")
     
     try:
-        # Quick power state check
-        cmd = [config.govc_bin, 'vm.info', vm_name]
-        result = subprocess.run(cmd, env=env, capture_output=True, text=True, timeout=10)
-        
-        for line in result.stdout.split('\n'):
-            if 'Power state:' in line:
-                logger.info(line.strip())
-            elif 'IP address:' in line:
-                logger.info(line.strip())
+        if isinstance(result, Exception):
+            raise result
         
-        # Quick IP check
-        cmd = [config.govc_bin, 'vm.ip', vm_name]
-        result = subprocess.run(cmd, env=env, capture_output=True, text=True, timeout=5)
+        # Power state and IP both come from one vm.info -json - no text
+        # scan, and no vm.ip waiting for an address to appear
+        returncode, stdout = result
         
-        if result.returncode == 0 and result.stdout.strip():
-            ip = result.stdout.strip()
+        if returncode == 0:
+            vm_data = json_field(json_loads(stdout), 'VirtualMachines', 0)
+            logger.info(f"Power state: {json_field(vm_data, 'Summary', 'Runtime', 'PowerState')}")
+            
+            ip = json_field(vm_data, 'Guest', 'IpAddress')
             if ip and ip != "0.0.0.0":
                 logger.info(f"✅ Current IP: {ip}")
                 logger.info(f"🚀 Try SSH: ssh ubuntu@{ip}")
             else:
                 logger.warn("❌ No IP or 0.0.0.0")
         else:
-            logger.warn("❌ Could not get IP")
+            logger.warn("❌ Could not get VM info")
             
     except subprocess.TimeoutExpired:
         logger.warn("⏰ Command timed out - ESXi may be busy")
     except Exception as e:
         logger.error(f"Error: {e}")
 
+def find_all_vms():
+    """Names of every VM on the host, sorted"""
+    config = get_config()
+    cmd = [config.govc_bin, 'find', '/', '-type', 'm']
+    result = subprocess.run(cmd, env=get_govc_env(), capture_output=True, text=True)
+    return sorted(line.rsplit('/', 1)[-1] for line in result.stdout.splitlines() if line)
+
 def main():
-    if len(sys.argv) != 2:
-        print("Usage: python3 quick_status.py <vm-name>")
+    if len(sys.argv) < 2:
+        print("Usage: python3 quick_status.py <vm-name> [<vm-name> ...]")
+        print("       python3 quick_status.py --all")
         sys.exit(1)
     
-    vm_name = sys.argv[1]
-    quick_status(vm_name)
+    if sys.argv[1] == '--all':
+        vm_names = find_all_vms()
+    else:
+        vm_names = sys.argv[1:]
+    
+    quick_statuses(vm_names)
 
 if __name__ == "__main__":
     main()
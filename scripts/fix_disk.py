@@ -5,99 +5,87 @@ Diagnoses and fixes disk expansion issues on VMs
 """
 
 import sys
+import os
 import subprocess
 
+# Add project root to path
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from modules.ssh import SSH_PASSWORD, run_report, ssh_command, start_ssh_master, stop_ssh_master
+
+# Remote scripts fed to 'bash -s': one ===TAG=== section per probe, each
+# followed by its exit code
+DISK_REPORT_SCRIPT = (
+    'echo "===DF==="; df -h / 2>&1; echo "RC=$?"\n'
+    'echo "===LSBLK==="; lsblk 2>&1; echo "RC=$?"\n'
+    'echo "===FDISK==="; sudo fdisk -l /dev/sda 2>&1; echo "RC=$?"\n'
+    'echo "===CI==="; sudo cloud-init status --long 2>/dev/null || echo "cloud-init not available"; echo "RC=$?"\n'
+    'echo "===MOUNT==="; mount | grep "on / "; echo "RC=$?"\n'
+)
+
+FIX_PREPARE_SCRIPT = (
+    'echo "===GROWPART==="; which growpart; echo "RC=$?"\n'
+    'echo "===ROOT==="; df / | tail -1 | awk \'{print $1}\'; echo "RC=$?"\n'
+)
+
+FIX_RESIZE_SCRIPT = (
+    'echo "===GROW==="; sudo growpart {disk} {partition_num} 2>&1; echo "RC=$?"\n'
+    'echo "===RESIZE==="; sudo resize2fs /dev/sda1 2>/dev/null || sudo xfs_growfs / 2>/dev/null || echo "Filesystem resize may have failed"; echo "RC=$?"\n'
+    'echo "===DF==="; df -h / 2>&1; echo "RC=$?"\n'
+)
+
 def check_disk_usage(vm_ip):
     """Check current disk usage and partition layout"""
     print(f"💾 Checking disk usage on {vm_ip}...")
     
     try:
-        # Test SSH connection
-        ssh_test = subprocess.run([
-            'ssh', 
-            '-o', 'ConnectTimeout=3',
-            '-o', 'StrictHostKeyChecking=no',
-            '-o', 'UserKnownHostsFile=/dev/null',
-            f'ubuntu@{vm_ip}', 'echo "SSH OK"'
-        ], capture_output=True, text=True, timeout=5)
-        
-        if ssh_test.returncode != 0:
+        # Test SSH by opening the master connection the checks will share,
+        # falling back to the default password for VMs deployed without a key
+        if not start_ssh_master(vm_ip, SSH_PASSWORD):
             print("❌ SSH connection failed")
             return False
         
         print("✅ SSH connection working")
         
+        # Run every probe in one remote shell
+        report = run_report(vm_ip, DISK_REPORT_SCRIPT, 30)
+        
         # Check disk usage
         print("\n1. Current disk usage:")
-        df_cmd = subprocess.run([
-            'ssh', 
-            '-o', 'ConnectTimeout=3',
-            '-o', 'StrictHostKeyChecking=no',
-            '-o', 'UserKnownHostsFile=/dev/null',
-            f'ubuntu@{vm_ip}', 'df -h /'
-        ], capture_output=True, text=True, timeout=10)
-        
-        if df_cmd.returncode == 0:
-            print(df_cmd.stdout)
+        rc, output = report.get('DF', (1, ''))
+        if rc == 0:
+            print(output + '\n')
         else:
             print("❌ Could not get disk usage")
             return False
         
         # Check physical disk size
         print("\n2. Physical disk information:")
-        lsblk_cmd = subprocess.run([
-            'ssh', 
-            '-o', 'ConnectTimeout=3',
-            '-o', 'StrictHostKeyChecking=no',
-            '-o', 'UserKnownHostsFile=/dev/null',
-            f'ubuntu@{vm_ip}', 'lsblk'
-        ], capture_output=True, text=True, timeout=10)
-        
-        if lsblk_cmd.returncode == 0:
-            print(lsblk_cmd.stdout)
+        rc, output = report.get('LSBLK', (1, ''))
+        if rc == 0:
+            print(output + '\n')
         else:
             print("❌ Could not get block device info")
         
         # Check partition table
         print("\n3. Partition information:")
-        fdisk_cmd = subprocess.run([
-            'ssh', 
-            '-o', 'ConnectTimeout=3',
-            '-o', 'StrictHostKeyChecking=no',
-            '-o', 'UserKnownHostsFile=/dev/null',
-            f'ubuntu@{vm_ip}', 'sudo fdisk -l /dev/sda'
-        ], capture_output=True, text=True, timeout=10)
-        
-        if fdisk_cmd.returncode == 0:
-            print(fdisk_cmd.stdout)
+        rc, output = report.get('FDISK', (1, ''))
+        if rc == 0:
+            print(output + '\n')
         else:
             print("⚠️  Could not get partition info (may not be /dev/sda)")
         
         # Check if cloud-init disk resize is enabled
         print("\n4. Cloud-init growpart status:")
-        growpart_cmd = subprocess.run([
-            'ssh', 
-            '-o', 'ConnectTimeout=3',
-            '-o', 'StrictHostKeyChecking=no',
-            '-o', 'UserKnownHostsFile=/dev/null',
-            f'ubuntu@{vm_ip}', 'sudo cloud-init status --long 2>/dev/null || echo "cloud-init not available"'
-        ], capture_output=True, text=True, timeout=10)
-        
-        if growpart_cmd.returncode == 0:
-            print(growpart_cmd.stdout.strip())
+        rc, output = report.get('CI', (1, ''))
+        if rc == 0:
+            print(output)
         
         # Check filesystem type
         print("\n5. Filesystem information:")
-        mount_cmd = subprocess.run([
-            'ssh', 
-            '-o', 'ConnectTimeout=3',
-            '-o', 'StrictHostKeyChecking=no',
-            '-o', 'UserKnownHostsFile=/dev/null',
-            f'ubuntu@{vm_ip}', 'mount | grep "on / "'
-        ], capture_output=True, text=True, timeout=10)
-        
-        if mount_cmd.returncode == 0:
-            print(mount_cmd.stdout.strip())
+        rc, output = report.get('MOUNT', (1, ''))
+        if rc == 0:
+            print(output)
         
         return True
         
@@ -113,25 +101,17 @@ def fix_disk_expansion(vm_ip):
     print(f"\n🔧 Attempting to fix disk expansion on {vm_ip}...")
     
     try:
+        # Steps 1 and 2 are read in one remote shell, as are steps 3 to 5;
+        # only the package install in between runs on its own
+        report = run_report(vm_ip, FIX_PREPARE_SCRIPT, 10)
+        
         # Step 1: Check if growpart is available
         print("Step 1: Checking for growpart utility...")
-        growpart_check = subprocess.run([
-            'ssh', 
-            '-o', 'ConnectTimeout=3',
-            '-o', 'StrictHostKeyChecking=no',
-            '-o', 'UserKnownHostsFile=/dev/null',
-            f'ubuntu@{vm_ip}', 'which growpart'
-        ], capture_output=True, text=True, timeout=10)
-        
-        if growpart_check.returncode != 0:
+        rc, _ = report.get('GROWPART', (1, ''))
+        
+        if rc != 0:
             print("   Installing cloud-guest-utils...")
-            install_cmd = subprocess.run([
-                'ssh', 
-                '-o', 'ConnectTimeout=3',
-                '-o', 'StrictHostKeyChecking=no',
-                '-o', 'UserKnownHostsFile=/dev/null',
-                f'ubuntu@{vm_ip}', 'sudo apt-get update && sudo apt-get install -y cloud-guest-utils'
-            ], timeout=120)
+            install_cmd = subprocess.run(ssh_command(vm_ip, 'sudo apt-get update && sudo apt-get install -y cloud-guest-utils'), timeout=120)
             
             if install_cmd.returncode == 0:
                 print("   ✅ cloud-guest-utils installed")
@@ -143,16 +123,9 @@ def fix_disk_expansion(vm_ip):
         
         # Step 2: Identify the root partition
         print("\nStep 2: Identifying root partition...")
-        root_partition_cmd = subprocess.run([
-            'ssh', 
-            '-o', 'ConnectTimeout=3',
-            '-o', 'StrictHostKeyChecking=no',
-            '-o', 'UserKnownHostsFile=/dev/null',
-            f'ubuntu@{vm_ip}', 'df / | tail -1 | awk \'{print $1}\''
-        ], capture_output=True, text=True, timeout=10)
-        
-        if root_partition_cmd.returncode == 0:
-            root_partition = root_partition_cmd.stdout.strip()
+        rc, root_partition = report.get('ROOT', (1, ''))
+        
+        if rc == 0:
             print(f"   Root partition: {root_partition}")
             
             # Extract disk and partition number
@@ -173,50 +146,34 @@ def fix_disk_expansion(vm_ip):
             disk = '/dev/sda'
             partition_num = '1'
         
+        report = run_report(vm_ip, FIX_RESIZE_SCRIPT.format(disk=disk, partition_num=partition_num), 100)
+        
         # Step 3: Grow the partition
         print(f"\nStep 3: Growing partition {disk}{partition_num}...")
-        growpart_cmd = subprocess.run([
-            'ssh', 
-            '-o', 'ConnectTimeout=3',
-            '-o', 'StrictHostKeyChecking=no',
-            '-o', 'UserKnownHostsFile=/dev/null',
-            f'ubuntu@{vm_ip}', f'sudo growpart {disk} {partition_num}'
-        ], capture_output=True, text=True, timeout=30)
-        
-        if growpart_cmd.returncode == 0:
+        rc, output = report.get('GROW', (1, ''))
+        
+        if rc == 0:
             print("   ✅ Partition grown successfully")
         else:
-            print(f"   ⚠️  Growpart result: {growpart_cmd.stderr.strip()}")
-            if "NOCHANGE" in growpart_cmd.stderr:
+            print(f"   ⚠️  Growpart result: {output}")
+            if "NOCHANGE" in output:
                 print("   ℹ️  Partition is already at maximum size")
         
         # Step 4: Resize the filesystem
         print("\nStep 4: Resizing filesystem...")
-        resize_cmd = subprocess.run([
-            'ssh', 
-            '-o', 'ConnectTimeout=3',
-            '-o', 'StrictHostKeyChecking=no',
-            '-o', 'UserKnownHostsFile=/dev/null',
-            f'ubuntu@{vm_ip}', 'sudo resize2fs /dev/sda1 2>/dev/null || sudo xfs_growfs / 2>/dev/null || echo "Filesystem resize may have failed"'
-        ], capture_output=True, text=True, timeout=60)
-        
-        if resize_cmd.returncode == 0:
+        rc, output = report.get('RESIZE', (1, ''))
+        
+        if rc == 0:
             print("   ✅ Filesystem resized")
         else:
-            print(f"   ⚠️  Filesystem resize result: {resize_cmd.stdout.strip()}")
+            print(f"   ⚠️  Filesystem resize result: {output}")
         
         # Step 5: Check result
         print("\nStep 5: Checking final disk usage...")
-        final_check = subprocess.run([
-            'ssh', 
-            '-o', 'ConnectTimeout=3',
-            '-o', 'StrictHostKeyChecking=no',
-            '-o', 'UserKnownHostsFile=/dev/null',
-            f'ubuntu@{vm_ip}', 'df -h /'
-        ], capture_output=True, text=True, timeout=10)
-        
-        if final_check.returncode == 0:
-            print(final_check.stdout)
+        rc, output = report.get('DF', (1, ''))
+        
+        if rc == 0:
+            print(output + '\n')
             print("🎉 Disk expansion process completed!")
         else:
             print("❌ Could not verify final disk usage")
@@ -243,12 +200,15 @@ def main():
     
     vm_ip = sys.argv[1]
     
-    if len(sys.argv) > 2 and sys.argv[2] == 'fix':
-        # Check first, then fix
-        if check_disk_usage(vm_ip):
-            fix_disk_expansion(vm_ip)
-    else:
-        check_disk_usage(vm_ip)
+    try:
+        if len(sys.argv) > 2 and sys.argv[2] == 'fix':
+            # Check first, then fix
+            if check_disk_usage(vm_ip):
+                fix_disk_expansion(vm_ip)
+        else:
+            check_disk_usage(vm_ip)
+    finally:
+        stop_ssh_master(vm_ip)
 
 if __name__ == "__main__":
     main()
@@ -10,6 +10,24 @@ This script will:
 import sys
 import subprocess
 import os
+import io
+import ipaddress
+import mmap
+import re
+import selectors
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+
+# Any dotted quad in deploy.py's output
+_IP_RE = re.compile(rb'\b(\d{1,3}(?:\.\d{1,3}){3})\b')
+
+# Where deploy.py lives
+DEPLOY_DIR = "/Users/rwiggins/tools/newubuntu"
+
+# Held while writing to stdout, so cleanup and deploy output don't mix
+# mid-line when the full workflow runs them together
+_output_lock = threading.Lock()
 
 def check_fixed_cloudinit_script():
     """Check if the cloud-init script has been fixed"""
@@ -21,10 +39,16 @@ def check_fixed_cloudinit_script():
         print(f"❌ Could not find {script_path}")
         return False
     
-    with open(script_path, 'r') as f:
-        content = f.read()
+    # Search the file in place rather than reading it into a string;
+    # an empty file can't be mapped but can't contain the line either
+    with open(script_path, 'rb') as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            found = False
+        else:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                found = mapped.find(b'datasource_list: ["NoCloud", "None"]') != -1
     
-    if 'datasource_list: ["NoCloud", "None"]' in content:
+    if found:
         print("❌ The problematic datasource_list is still in the cloud-init script!")
         print("   Run this command to fix it:")
         print("   sed -i '' '/datasource_list:/d' /Users/rwiggins/tools/newubuntu/modules/cloudinit.py")
@@ -35,35 +59,25 @@ def check_fixed_cloudinit_script():
 
 def deploy_new_vm():
     """Deploy a new VM with corrected configuration"""
-    print("\n🚀 Deploying new VM with corrected cloud-init configuration...")
-    
-    # Change to the newubuntu directory
-    os.chdir("/Users/rwiggins/tools/newubuntu")
+    with _output_lock:
+        print("\n🚀 Deploying new VM with corrected cloud-init configuration...", flush=True)
     
     try:
-        # Run the deployment script
-        result = subprocess.run([
-            'python3', 'deploy.py'
-        ], capture_output=True, text=True, timeout=600)
+        # Run the deployment script from the newubuntu directory, showing
+        # its output as it happens
+        returncode, output = run_streaming(['python3', 'deploy.py'], timeout=600, cwd=DEPLOY_DIR)
         
-        if result.returncode == 0:
+        if returncode == 0:
             print("✅ New VM deployment initiated successfully!")
-            print("Output:")
-            print(result.stdout)
             
             # Extract VM IP if possible
-            lines = result.stdout.split('\n')
-            for line in lines:
-                if 'IP:' in line or '192.168.' in line:
-                    print(f"🎯 VM Details: {line}")
+            for line in output.split(b'\n'):
+                if find_vm_ip(line):
+                    print(f"🎯 VM Details: {line.decode('utf-8', 'replace')}")
         else:
-            print("❌ VM deployment failed!")
-            print("Error:")
-            print(result.stderr)
-            print("Output:")
-            print(result.stdout)
+            print("❌ VM deployment failed! See the output above")
         
-        return result.returncode == 0
+        return returncode == 0
         
     except subprocess.TimeoutExpired:
         print("❌ VM deployment timed out")
@@ -72,9 +86,64 @@ def deploy_new_vm():
         print(f"❌ VM deployment error: {e}")
         return False
 
+def find_vm_ip(line):
+    """First address in a line of deploy output that could be the new VM's
+    
+    Only private addresses count, so a public IP in a download URL or
+    banner is ignored, as are the .0/.1/.255 addresses a network, its usual
+    gateway and its broadcast address use.
+    """
+    for match in _IP_RE.finditer(line):
+        ip = match.group(1).decode()
+        try:
+            private = ipaddress.ip_address(ip).is_private
+        except ValueError:
+            continue
+        if private and not ip.endswith(('.0', '.1', '.255')):
+            return ip
+    return None
+
+def run_streaming(cmd, timeout, cwd=None):
+    """Run cmd, copying its output to our stdout as it arrives
+    
+    Returns (exit code, combined stdout/stderr bytes). The child is stopped
+    and subprocess.TimeoutExpired raised once timeout seconds have passed.
+    """
+    deadline = time.monotonic() + timeout
+    output = io.BytesIO()
+    sys.stdout.flush()
+    proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, bufsize=0, cwd=cwd)
+    try:
+        with selectors.DefaultSelector() as selector:
+            selector.register(proc.stdout, selectors.EVENT_READ)
+            while True:
+                if time.monotonic() > deadline:
+                    raise subprocess.TimeoutExpired(cmd, timeout)
+                if not selector.select(timeout=1.0):
+                    continue
+                chunk = os.read(proc.stdout.fileno(), 4096)
+                if not chunk:
+                    break
+                with _output_lock:
+                    sys.stdout.buffer.write(chunk)
+                    sys.stdout.buffer.flush()
+                output.write(chunk)
+        return proc.wait(timeout=max(deadline - time.monotonic(), 0)), output.getvalue()
+    finally:
+        # Timeout, Ctrl-C or error - don't leave the child running
+        if proc.poll() is None:
+            proc.terminate()
+            try:
+                proc.wait(timeout=5)
+            except subprocess.TimeoutExpired:
+                proc.kill()
+                proc.wait()
+        proc.stdout.close()
+
 def cleanup_broken_vm(vm_ip):
     """Optionally cleanup the broken VM"""
-    print(f"\n🗑️  Cleaning up broken VM at {vm_ip}...")
+    with _output_lock:
+        print(f"\n🗑️  Cleaning up broken VM at {vm_ip}...", flush=True)
     
     try:
         # Use the destroy script if available
@@ -82,15 +151,17 @@ def cleanup_broken_vm(vm_ip):
             'python3', 'scripts/destroy_vm.py', vm_ip
         ], capture_output=True, text=True, timeout=120)
         
-        if result.returncode == 0:
-            print("✅ Broken VM cleaned up successfully")
-        else:
-            print("⚠️  VM cleanup may have failed - check manually")
-            print(result.stderr)
+        with _output_lock:
+            if result.returncode == 0:
+                print("✅ Broken VM cleaned up successfully", flush=True)
+            else:
+                print("⚠️  VM cleanup may have failed - check manually")
+                print(result.stderr, flush=True)
         
     except Exception as e:
-        print(f"⚠️  Could not cleanup VM automatically: {e}")
-        print("You may need to cleanup manually through your hypervisor")
+        with _output_lock:
+            print(f"⚠️  Could not cleanup VM automatically: {e}")
+            print("You may need to cleanup manually through your hypervisor", flush=True)
 
 def test_new_vm(vm_ip):
     """Test the new VM installation"""
@@ -99,7 +170,7 @@ def test_new_vm(vm_ip):
     try:
         # Wait a bit for the VM to fully boot
         print("Waiting 30 seconds for VM to complete setup...")
-        subprocess.run(['sleep', '30'])
+        time.sleep(30)
         
         # Test with the troubleshooting script
         result = subprocess.run([
@@ -154,9 +225,14 @@ def main():
             broken_vm_ip = sys.argv[2]
             print(f"🔄 Full workflow: cleanup {broken_vm_ip}, deploy new, test")
             
-            cleanup_broken_vm(broken_vm_ip)
+            # The new VM doesn't depend on the old one being gone, so the
+            # destroy runs alongside the deployment
+            with ThreadPoolExecutor(max_workers=2) as executor:
+                cleanup = executor.submit(cleanup_broken_vm, broken_vm_ip)
+                deploy = executor.submit(deploy_new_vm)
+                wait([cleanup, deploy])
             
-            if deploy_new_vm():
+            if deploy.result():
                 print("\n⏳ Waiting for new VM to be ready...")
                 # You'll need to manually get the new VM IP and test
                 print("📝 Please note the new VM IP from the deployment output above")
@@ -7,18 +7,18 @@ import sys
 import os
 sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..'))
 
-from modules.config import Config
-from modules.logger import Logger
+from modules.config import get_config
+from modules.logger import get_logger
+from modules.govc import get_govc_env, wait_guest_ip
 import subprocess
 import time
 
 def fix_cdrom_and_boot(vm_name):
-    config = Config()
-    logger = Logger()
+    config = get_config()
+    logger = get_logger()
     
-    env = os.environ.copy()
-    env['GOVC_URL'] = f"https://{config.esxi_user}:{config.esxi_password}@{config.esxi_host}/sdk"
-    env['GOVC_INSECURE'] = '1'
+    # Set govc environment - one login shared by every govc call
+    env = get_govc_env()
     
     logger.info(f"🔧 Fixing CD-ROM connection for: {vm_name}")
     
@@ -26,13 +26,13 @@ def fix_cdrom_and_boot(vm_name):
         # Step 1: Power off VM
         logger.info("Step 1: Powering off VM...")
         cmd = [config.govc_bin, 'vm.power', '-off', vm_name]
-        result = subprocess.run(cmd, env=env, capture_output=True, text=True)
+        subprocess.run(cmd, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
         time.sleep(5)
         
         # Step 2: Connect the CD-ROM device
         logger.info("Step 2: Connecting cloud-init CD-ROM...")
         cmd = [config.govc_bin, 'device.connect', '-vm', vm_name, 'cdrom-3002']
-        result = subprocess.run(cmd, env=env, capture_output=True, text=True)
+        result = subprocess.run(cmd, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True)
         
         if result.returncode == 0:
             logger.info("✅ CD-ROM connected successfully")
@@ -44,7 +44,7 @@ def fix_cdrom_and_boot(vm_name):
         
         # Method 1: Try device.boot
         cmd = [config.govc_bin, 'device.boot', '-vm', vm_name, '-order', 'cdrom-3002,disk-1000-0']
-        result = subprocess.run(cmd, env=env, capture_output=True, text=True)
+        result = subprocess.run(cmd, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
         
         if result.returncode == 0:
             logger.info("✅ Boot order set via device.boot")
@@ -52,7 +52,7 @@ def fix_cdrom_and_boot(vm_name):
             # Method 2: Try generic boot order
             logger.info("Trying alternative boot order method...")
             cmd = [config.govc_bin, 'device.boot', '-vm', vm_name, '-order', 'cdrom,disk']
-            result = subprocess.run(cmd, env=env, capture_output=True, text=True)
+            result = subprocess.run(cmd, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
             
             if result.returncode == 0:
                 logger.info("✅ Boot order set via generic method")
@@ -63,7 +63,7 @@ def fix_cdrom_and_boot(vm_name):
         # Step 4: Power on VM
         logger.info("Step 4: Powering on VM...")
         cmd = [config.govc_bin, 'vm.power', '-on', vm_name]
-        result = subprocess.run(cmd, env=env, capture_output=True, text=True)
+        result = subprocess.run(cmd, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True)
         
         if result.returncode == 0:
             logger.info("✅ VM powered on")
@@ -75,27 +75,16 @@ def fix_cdrom_and_boot(vm_name):
         logger.info("Step 5: Monitoring VM boot...")
         logger.info("VM should now boot from CD-ROM and run cloud-init")
         
-        for i in range(60):  # Wait up to 10 minutes
-            time.sleep(10)
-            
-            # Check IP
-            cmd = [config.govc_bin, 'vm.ip', vm_name]
-            result = subprocess.run(cmd, env=env, capture_output=True, text=True, timeout=5)
-            
-            if result.returncode == 0 and result.stdout.strip():
-                ip = result.stdout.strip()
-                if ip and ip != "0.0.0.0":
-                    logger.info(f"✅ VM got IP: {ip}")
-                    logger.info(f"🚀 Try SSH: ssh ubuntu@{ip} (password: ubuntu)")
-                    logger.info("Or try console login: ubuntu/ubuntu")
-                    return
-            
-            if i % 6 == 0:  # Every minute
-                logger.info(f"Still waiting... ({i//6 + 1}/10 minutes)")
-            else:
-                print(".", end="", flush=True)
+        # One blocking wait - ESXi tells us when VMware Tools reports an IP
+        logger.info("Waiting up to 10 minutes for an IP...")
+        ip = wait_guest_ip(config, env, vm_name, 600)
+        
+        if ip:
+            logger.info(f"✅ VM got IP: {ip}")
+            logger.info(f"🚀 Try SSH: ssh ubuntu@{ip} (password: ubuntu)")
+            logger.info("Or try console login: ubuntu/ubuntu")
+            return
         
-        print()
         logger.warn("VM booted but no IP yet. Check ESXi console for progress.")
         logger.info("Try console login in ESXi web interface")
         
@@ -5,109 +5,98 @@ This script will fix the datasource_list issue on already deployed VMs
 """
 
 import sys
+import os
 import subprocess
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..'))
+
+from modules.ssh import SSH_PASSWORD, run_report, ssh_command, start_ssh_master, stop_ssh_master
+
+# Every instance's cloud-config.txt
+FIND_CLOUD_CONFIGS = 'sudo -n find /var/lib/cloud/instances -maxdepth 2 -name cloud-config.txt'
+
+# Remote script fed to 'bash -s': one ===TAG=== section per step, each
+# followed by its exit code. The first schema check keeps its stderr apart
+# in SCHEMA_ERR so errors are reported separately. sudo -n fails at once
+# rather than waiting on a password prompt nobody can answer, and pipefail
+# lets a failed find show in the backup and fix exit codes.
+SCHEMA_FIX_SCRIPT = (
+    'set -o pipefail\n'
+    'echo "===SCHEMA==="; { err=$(sudo -n cloud-init schema --system 2>&1 >&3); rc=$?; } 3>&1; echo "RC=$rc"\n'
+    'echo "===SCHEMA_ERR==="; [ -n "$err" ] && printf "%s\\n" "$err"; echo "RC=0"\n'
+    'echo "===BACKUP==="\n'
+    'if ! configs=$(' + FIND_CLOUD_CONFIGS + ' 2>&1); then echo "$configs"; false\n'
+    'elif [ -z "$configs" ]; then echo "No cloud-config.txt found"; false\n'
+    'else ' + FIND_CLOUD_CONFIGS + ' -print0 | sudo -n xargs -0 -I{} cp -- {} {}.backup 2>&1; fi\n'
+    'echo "RC=$?"\n'
+    'echo "===FIX==="; ' + FIND_CLOUD_CONFIGS + ' -print0 | sudo -n xargs -0 -r sed -i \'/^datasource_list:/d\' -- 2>&1; echo "RC=$?"\n'
+    'echo "===CLEAN==="; sudo -n cloud-init clean --logs >/dev/null 2>&1; echo "RC=$?"\n'
+    'echo "===VERIFY==="; sudo -n cloud-init schema --system 2>/dev/null; echo "RC=$?"\n'
+)
 
 def fix_cloud_init_schema(vm_ip):
     """Fix cloud-init schema validation errors on a deployed VM"""
     print(f"🔧 Fixing cloud-init schema issues on {vm_ip}...")
     
     try:
-        # Test SSH connection first
-        ssh_test = subprocess.run([
-            'ssh', 
-            '-o', 'ConnectTimeout=3',
-            '-o', 'StrictHostKeyChecking=no',
-            '-o', 'UserKnownHostsFile=/dev/null',
-            f'ubuntu@{vm_ip}', 'echo "SSH OK"'
-        ], capture_output=True, text=True, timeout=5)
-        
-        if ssh_test.returncode != 0:
+        # Test SSH by opening the master connection every step below shares,
+        # falling back to the default password for VMs deployed without a key
+        if not start_ssh_master(vm_ip, SSH_PASSWORD):
             print("❌ SSH connection failed")
             return False
         
         print("✅ SSH connection working")
         
+        # Steps 1 to 5 run in one remote shell; step 6 only runs if the
+        # schema validates, so it stays a separate call
+        report = run_report(vm_ip, SCHEMA_FIX_SCRIPT, 65)
+        
         # Check current schema validation status
         print("\n1. Checking current cloud-init schema status:")
-        schema_check = subprocess.run([
-            'ssh', 
-            '-o', 'ConnectTimeout=3',
-            '-o', 'StrictHostKeyChecking=no',
-            '-o', 'UserKnownHostsFile=/dev/null',
-            f'ubuntu@{vm_ip}', 'sudo cloud-init schema --system'
-        ], capture_output=True, text=True, timeout=15)
-        
-        print(schema_check.stdout)
-        if schema_check.stderr:
+        _, output = report.get('SCHEMA', (1, ''))
+        print(output)
+        _, errors = report.get('SCHEMA_ERR', (0, ''))
+        if errors:
             print("Schema errors found:")
-            print(schema_check.stderr)
+            print(errors)
         
         # Find and backup the problematic cloud-config file
         print("\n2. Backing up current cloud-config...")
-        backup_cmd = subprocess.run([
-            'ssh', 
-            '-o', 'ConnectTimeout=3',
-            '-o', 'StrictHostKeyChecking=no',
-            '-o', 'UserKnownHostsFile=/dev/null',
-            f'ubuntu@{vm_ip}', 
-            'sudo cp /var/lib/cloud/instances/*/cloud-config.txt /var/lib/cloud/instances/*/cloud-config.txt.backup 2>/dev/null || echo "No cloud-config.txt found"'
-        ], capture_output=True, text=True, timeout=10)
+        rc, output = report.get('BACKUP', (1, ''))
         
-        if backup_cmd.returncode == 0:
+        if rc == 0:
             print("✅ Backup created")
+        else:
+            print(f"⚠️  Backup failed: {output}")
         
         # Remove datasource_list from user-data
         print("\n3. Fixing cloud-config user-data...")
-        fix_cmd = subprocess.run([
-            'ssh', 
-            '-o', 'ConnectTimeout=3',
-            '-o', 'StrictHostKeyChecking=no',
-            '-o', 'UserKnownHostsFile=/dev/null',
-            f'ubuntu@{vm_ip}', 
-            '''sudo find /var/lib/cloud/instances/ -name "cloud-config.txt" -exec sed -i '/^datasource_list:/d' {} \; 2>/dev/null || echo "No changes needed"'''
-        ], capture_output=True, text=True, timeout=10)
+        rc, output = report.get('FIX', (1, ''))
         
-        if fix_cmd.returncode == 0:
+        if rc == 0:
             print("✅ Removed datasource_list from user-data")
+        else:
+            print(f"⚠️  Fix failed: {output}")
         
         # Clean and reinitialize cloud-init
         print("\n4. Cleaning and reinitializing cloud-init...")
-        clean_cmd = subprocess.run([
-            'ssh', 
-            '-o', 'ConnectTimeout=3',
-            '-o', 'StrictHostKeyChecking=no',
-            '-o', 'UserKnownHostsFile=/dev/null',
-            f'ubuntu@{vm_ip}', 
-            'sudo cloud-init clean --logs'
-        ], capture_output=True, text=True, timeout=15)
+        rc, _ = report.get('CLEAN', (1, ''))
         
-        if clean_cmd.returncode == 0:
+        if rc == 0:
             print("✅ Cloud-init cleaned")
         
         # Verify schema is now valid
         print("\n5. Verifying fixed schema:")
-        final_check = subprocess.run([
-            'ssh', 
-            '-o', 'ConnectTimeout=3',
-            '-o', 'StrictHostKeyChecking=no',
-            '-o', 'UserKnownHostsFile=/dev/null',
-            f'ubuntu@{vm_ip}', 'sudo cloud-init schema --system'
-        ], capture_output=True, text=True, timeout=15)
+        rc, output = report.get('VERIFY', (1, ''))
         
-        print(final_check.stdout)
-        if final_check.returncode == 0 and "Valid schema" in final_check.stdout:
+        print(output)
+        if rc == 0 and "Valid schema" in output:
             print("✅ Schema validation successful!")
             
             # Try to complete any pending installations
             print("\n6. Attempting to complete installations...")
-            install_cmd = subprocess.run([
-                'ssh', 
-                '-o', 'ConnectTimeout=3',
-                '-o', 'StrictHostKeyChecking=no',
-                '-o', 'UserKnownHostsFile=/dev/null',
-                f'ubuntu@{vm_ip}', 
-                'sudo cloud-init modules --mode=config && sudo cloud-init modules --mode=final'
-            ], timeout=300)
+            install_cmd = subprocess.run(ssh_command(
+                vm_ip, 'sudo -n cloud-init modules --mode=config && sudo -n cloud-init modules --mode=final'
+            ), timeout=300)
             
             if install_cmd.returncode == 0:
                 print("✅ Cloud-init modules completed")
@@ -136,7 +125,10 @@ def main():
         sys.exit(1)
     
     vm_ip = sys.argv[1]
-    fix_cloud_init_schema(vm_ip)
+    try:
+        fix_cloud_init_schema(vm_ip)
+    finally:
+        stop_ssh_master(vm_ip)
 
 if __name__ == "__main__":
     main()
@@ -7,19 +7,27 @@ import sys
 import os
 sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..'))
 
-from modules.config import Config
-from modules.logger import Logger
+from modules.config import get_config
+from modules.logger import get_logger
+from modules.govc import get_govc_env, json_field, json_loads, wait_guest_ip
 import subprocess
 import time
 
+def _power_state(config, env, vm_name):
+    """The VM's power state from vm.info -json, None if unknown"""
+    cmd = [config.govc_bin, 'vm.info', '-json', vm_name]
+    result = subprocess.run(cmd, env=env, capture_output=True)
+    if result.returncode != 0:
+        return None
+    vm_data = json_field(json_loads(result.stdout), 'VirtualMachines', 0)
+    return json_field(vm_data, 'Runtime', 'PowerState')
+
 def fix_vm_network(vm_name):
-    config = Config()
-    logger = Logger()
+    config = get_config()
+    logger = get_logger()
     
-    # Set govc environment
-    env = os.environ.copy()
-    env['GOVC_URL'] = f"https://{config.esxi_user}:{config.esxi_password}@{config.esxi_host}/sdk"
-    env['GOVC_INSECURE'] = '1'
+    # Set govc environment - one login shared by every govc call
+    env = get_govc_env()
     
     logger.info(f"🔧 Fixing network for VM: {vm_name}")
     
@@ -27,35 +35,32 @@ def fix_vm_network(vm_name):
         # Step 1: Ensure network adapter is connected
         logger.info("Step 1: Connecting network adapter...")
         cmd = [config.govc_bin, 'device.connect', '-vm', vm_name, 'ethernet-0']
-        result = subprocess.run(cmd, env=env, capture_output=True, text=True)
-        
-        # Step 2: Force power cycle to reset network
-        logger.info("Step 2: Power cycling VM...")
-        cmd = [config.govc_bin, 'vm.power', '-off', vm_name]
-        result = subprocess.run(cmd, env=env, capture_output=True, text=True)
+        subprocess.run(cmd, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
         
-        time.sleep(5)
+        # Step 2: Force power cycle to reset network - only a running VM
+        # needs powering off first
+        if _power_state(config, env, vm_name) == 'poweredOn':
+            logger.info("Step 2: Power cycling VM...")
+            cmd = [config.govc_bin, 'vm.power', '-off', vm_name]
+            subprocess.run(cmd, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+            
+            time.sleep(5)
+        else:
+            logger.info("Step 2: Powering on VM...")
         
         cmd = [config.govc_bin, 'vm.power', '-on', vm_name]
-        result = subprocess.run(cmd, env=env, capture_output=True, text=True)
+        subprocess.run(cmd, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
         
         # Step 3: Wait for boot and check IP
         logger.info("Step 3: Waiting for VM to boot...")
-        for i in range(30):
-            time.sleep(10)
-            cmd = [config.govc_bin, 'vm.ip', vm_name]
-            result = subprocess.run(cmd, env=env, capture_output=True, text=True)
-            
-            if result.returncode == 0 and result.stdout.strip():
-                ip = result.stdout.strip()
-                if ip != "0.0.0.0":
-                    logger.info(f"✅ VM IP: {ip}")
-                    logger.info(f"Try SSH: ssh ubuntu@{ip} (password: ubuntu)")
-                    return
-            
-            print(".", end="", flush=True)
+        # One blocking wait - ESXi tells us when VMware Tools reports an IP
+        ip = wait_guest_ip(config, env, vm_name, 300)
+        
+        if ip:
+            logger.info(f"✅ VM IP: {ip}")
+            logger.info(f"Try SSH: ssh ubuntu@{ip} (password: ubuntu)")
+            return
         
-        print()
         logger.warn("VM still has no IP after power cycle")
         
         # Step 4: Check if we need to manually run cloud-init
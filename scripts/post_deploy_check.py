@@ -8,36 +8,119 @@ import sys
 import os
 import subprocess
 import time
+import asyncio
+
+# Options for every ssh call. BatchMode makes a missing key fail at once
+# instead of hanging on a password prompt.
+SSH_OPTS = (
+    '-o', 'ConnectTimeout=3',
+    '-o', 'StrictHostKeyChecking=no',
+    '-o', 'UserKnownHostsFile=/dev/null',
+    '-o', 'BatchMode=yes',
+)
+
+# A new readiness probe starts every PROBE_INTERVAL seconds without waiting
+# for the previous one to time out, with at most MAX_PROBES in flight
+PROBE_INTERVAL = 2
+MAX_PROBES = 4
+
+# Seconds between progress messages while the validator runs
+HEARTBEAT_INTERVAL = 30
+
+async def probe_ssh(vm_ip, timeout=5):
+    """One SSH login attempt, True if it succeeded"""
+    try:
+        proc = await asyncio.create_subprocess_exec(
+            'ssh', *SSH_OPTS, f'ubuntu@{vm_ip}', 'echo "ready"',
+            stdin=asyncio.subprocess.DEVNULL, stdout=asyncio.subprocess.DEVNULL, stderr=asyncio.subprocess.DEVNULL
+        )
+    except OSError:
+        return False
+    try:
+        return await asyncio.wait_for(proc.wait(), timeout) == 0
+    except asyncio.TimeoutError:
+        return False
+    finally:
+        # Timed out, or cancelled because another probe got in first
+        if proc.returncode is None:
+            proc.kill()
+            await proc.wait()
+
+async def wait_async(vm_ip, max_wait):
+    """Probe SSH on a fixed schedule until one probe succeeds or max_wait passes"""
+    deadline = time.monotonic() + max_wait
+    next_probe = time.monotonic()
+    pending = set()
+    try:
+        while time.monotonic() < deadline:
+            if time.monotonic() >= next_probe and len(pending) < MAX_PROBES:
+                pending.add(asyncio.ensure_future(probe_ssh(vm_ip)))
+                next_probe = time.monotonic() + PROBE_INTERVAL
+            
+            # Wake for the next probe, or with every slot busy, for the
+            # first one to finish
+            wake = next_probe if len(pending) < MAX_PROBES else deadline
+            timeout = max(min(wake, deadline) - time.monotonic(), 0)
+            if not pending:
+                await asyncio.sleep(timeout)
+                continue
+            
+            done, pending = await asyncio.wait(pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.result():
+                    return True
+                print(".", end="", flush=True)
+        return False
+    finally:
+        for task in pending:
+            task.cancel()
+        await asyncio.gather(*pending, return_exceptions=True)
 
 def wait_for_vm_ready(vm_ip, max_wait=300):
     """Wait for VM to be ready for validation"""
     print(f"⏳ Waiting for VM {vm_ip} to be ready for validation...")
     
-    start_time = time.time()
-    while time.time() - start_time < max_wait:
-        try:
-            result = subprocess.run([
-                'ssh', '-o', 'ConnectTimeout=3',
-                '-o', 'StrictHostKeyChecking=no',
-                '-o', 'UserKnownHostsFile=/dev/null',
-                f'ubuntu@{vm_ip}', 'echo "ready"'
-            ], capture_output=True, text=True, timeout=5)
-            
-            if result.returncode == 0:
-                print(f"✅ VM {vm_ip} is ready for validation")
-                return True
-                
-        except subprocess.TimeoutExpired:
-            pass
-        except Exception:
-            pass
-            
-        print(".", end="", flush=True)
-        time.sleep(10)
+    if asyncio.run(wait_async(vm_ip, max_wait)):
+        print(f"\n✅ VM {vm_ip} is ready for validation")
+        return True
     
     print(f"\n❌ VM {vm_ip} did not become ready within {max_wait} seconds")
     return False
 
+def wait_for_cloudinit(vm_ip, timeout=600):
+    """Wait for cloud-init on the VM to finish
+    
+    'cloud-init status --wait' blocks on the VM until cloud-init is done and
+    returns at once if it already is. Older cloud-init without it gets a
+    fixed 60 second wait instead.
+    """
+    print("⏳ Waiting for cloud-init to complete...")
+    
+    try:
+        result = subprocess.run([
+            'ssh', *SSH_OPTS, f'ubuntu@{vm_ip}', 'cloud-init status --wait --long'
+        ], capture_output=True, text=True, timeout=timeout)
+        
+        # Any exit code is fine as long as cloud-init reported a status -
+        # the validator will pick up a failed run
+        for line in result.stdout.splitlines():
+            if line.lstrip('.').startswith('status:'):
+                print(f"✅ cloud-init {line.lstrip('.')}")
+                return
+            
+    except subprocess.TimeoutExpired:
+        print(f"⚠️  cloud-init still running after {timeout} seconds, validating anyway")
+        return
+    except Exception:
+        pass
+    
+    print("⏳ cloud-init status unavailable, waiting 60 seconds instead...")
+    time.sleep(60)
+
+def _heartbeat(elapsed):
+    """Show that a long-running step is still going"""
+    print(f"\n⏳ Still validating... ({int(elapsed)}s)", flush=True)
+
 def run_post_deployment_validation(vm_ip):
     """Run full deployment validation"""
     print(f"🔍 Running post-deployment validation for {vm_ip}...")
@@ -46,12 +129,20 @@ def run_post_deployment_validation(vm_ip):
     script_dir = os.path.dirname(os.path.abspath(__file__))
     validator_path = os.path.join(script_dir, 'validator.py')
     
+    proc = None
     try:
-        result = subprocess.run([
-            'python3', validator_path, 'deploy', vm_ip
-        ], capture_output=False, timeout=120)
-        
-        return result.returncode == 0
+        # The validator writes straight to our terminal; we only wait on it,
+        # saying so every HEARTBEAT_INTERVAL seconds
+        proc = subprocess.Popen(['python3', validator_path, 'deploy', vm_ip])
+        start = time.monotonic()
+        deadline = start + 120
+        while True:
+            try:
+                return proc.wait(timeout=min(HEARTBEAT_INTERVAL, max(deadline - time.monotonic(), 0))) == 0
+            except subprocess.TimeoutExpired:
+                if time.monotonic() >= deadline:
+                    raise
+                _heartbeat(time.monotonic() - start)
         
     except subprocess.TimeoutExpired:
         print("❌ Post-deployment validation timed out")
@@ -59,6 +150,15 @@ def run_post_deployment_validation(vm_ip):
     except Exception as e:
         print(f"❌ Post-deployment validation error: {e}")
         return False
+    finally:
+        # Timed out or interrupted - stop the validator, forcibly if needed
+        if proc is not None and proc.poll() is None:
+            proc.terminate()
+            try:
+                proc.wait(timeout=5)
+            except subprocess.TimeoutExpired:
+                proc.kill()
+                proc.wait()
 
 def main():
     if len(sys.argv) < 2:
@@ -76,9 +176,8 @@ def main():
     if not wait_for_vm_ready(vm_ip, max_wait):
         sys.exit(1)
     
-    # Wait a bit more for cloud-init to complete
-    print("⏳ Waiting additional 60 seconds for cloud-init to complete...")
-    time.sleep(60)
+    # Wait for cloud-init to complete
+    wait_for_cloudinit(vm_ip)
     
     # Run validation
     success = run_post_deployment_validation(vm_ip)
@@ -6,13 +6,15 @@ Creates a test VM just to verify destruction works
 
 import sys
 import os
+import argparse
 import subprocess
 
 # Add project root to path
 sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
 
-from modules.config import Config
-from modules.logger import Logger
+from modules.config import get_config
+from modules.logger import get_logger
+from modules.govc import get_govc_env
 
 def create_test_vm(config, logger, env):
     """Create a minimal test VM for destruction testing"""
@@ -44,29 +46,54 @@ def create_test_vm(config, logger, env):
         logger.error(f"Error creating test VM: {e}")
         return None
 
+def build_parser():
+    parser = argparse.ArgumentParser(
+        prog='test_destroy.py',
+        description="Create a throwaway VM to check that VM destruction works"
+    )
+    parser.add_argument('-y', '--yes', action='store_true', help="Create the test VM without asking")
+    parser.add_argument('--auto-destroy', action='store_true',
+                        help="Destroy the test VM with destroy_vm.py straight after creating it")
+    return parser
+
 def main():
-    config = Config()
-    logger = Logger()
+    args = build_parser().parse_args()
+    
+    config = get_config()
+    logger = get_logger()
     
-    # Set up environment
-    env = os.environ.copy()
-    env['GOVC_URL'] = f"https://{config.esxi_user}:{config.esxi_password}@{config.esxi_host}/sdk"
-    env['GOVC_INSECURE'] = '1'
+    # Set up environment - just what govc needs, logged in once
+    env = get_govc_env()
     
     print("🧪 VM Destruction Test")
     print("=" * 30)
     print("This will create a test VM and then destroy it to verify the destruction script works.")
     
-    confirm = input("Create test VM for destruction? (yes/no): ").strip().lower()
-    
-    if confirm != 'yes':
-        print("Test cancelled")
-        return
+    if not args.yes:
+        confirm = input("Create test VM for destruction? (yes/no): ").strip().lower()
+        
+        if confirm != 'yes':
+            print("Test cancelled")
+            return
     
     # Create test VM
     test_vm = create_test_vm(config, logger, env)
     
-    if test_vm:
+    if test_vm and args.auto_destroy:
+        print(f"\n✅ Test VM '{test_vm}' created, destroying it...")
+        
+        # destroy_vm.py asks for 'DELETE <name>'; --auto-destroy already
+        # said yes for the VM we just made
+        destroy_script = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'destroy_vm.py')
+        result = subprocess.run([sys.executable, destroy_script, test_vm],
+                                input=f"DELETE {test_vm}\n", text=True)
+        
+        if result.returncode == 0:
+            print(f"✅ Destruction test finished for '{test_vm}' - check the output above")
+        else:
+            print(f"❌ destroy_vm.py failed - remove '{test_vm}' manually")
+            sys.exit(1)
+    elif test_vm:
         print(f"\n✅ Test VM '{test_vm}' created")
         print(f"\nNow run the destruction script:")
         print(f"python3 scripts/destroy_vm.py {test_vm}")
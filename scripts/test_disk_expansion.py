@@ -10,18 +10,17 @@ import subprocess
 # Add project root to path
 sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
 
-from modules.config import Config
-from modules.logger import Logger
+from modules.config import get_config
+from modules.logger import get_logger
+from modules.govc import get_govc_env, json_field, json_loads, wait_power_off
 
 def test_disk_expansion(vm_name):
     """Test disk expansion on existing VM"""
-    config = Config()
-    logger = Logger()
+    config = get_config()
+    logger = get_logger()
     
-    # Set govc environment
-    env = os.environ.copy()
-    env['GOVC_URL'] = f"https://{config.esxi_user}:{config.esxi_password}@{config.esxi_host}/sdk"
-    env['GOVC_INSECURE'] = '1'
+    # Set govc environment - one login shared by every govc call
+    env = get_govc_env()
     
     logger.info(f"Testing disk expansion on: {vm_name}")
     logger.info(f"Target size: {config.vm_disk_size}GB")
@@ -32,33 +31,33 @@ def test_disk_expansion(vm_name):
         cmd = [config.govc_bin, 'vm.power', '-off', vm_name]
         result = subprocess.run(cmd, env=env, capture_output=True, text=True)
         
-        import time
-        time.sleep(5)
+        # Carry on as soon as ESXi reports it off, rather than a fixed 5s
+        wait_power_off(config, env, vm_name)
         
         # Get current disk info
         logger.info("Getting current disk information...")
         cmd = [config.govc_bin, 'vm.info', '-json', vm_name]
-        result = subprocess.run(cmd, env=env, capture_output=True, text=True)
+        result = subprocess.run(cmd, env=env, capture_output=True)
         
         if result.returncode != 0:
             logger.error("Could not get VM info")
             return
         
-        import json
-        vm_data = json.loads(result.stdout)
-        disks = vm_data['VirtualMachines'][0]['Config']['Hardware']['Device']
+        vm_data = json_loads(result.stdout)
+        disks = json_field(vm_data, 'VirtualMachines', 0, 'Config', 'Hardware', 'Device') or []
         
         logger.info("Found devices:")
         for device in disks:
-            if 'CapacityInBytes' in device:
-                label = device.get('DeviceInfo', {}).get('Label', 'Unknown')
-                size_gb = device['CapacityInBytes'] // (1024**3)
+            capacity = json_field(device, 'CapacityInBytes')
+            if capacity is not None:
+                label = json_field(device, 'DeviceInfo', 'Label') or 'Unknown'
+                size_gb = capacity // (1024**3)
                 logger.info(f"  {label}: {size_gb}GB")
         
         # Find disk to expand
         disk_device = None
         for device in disks:
-            if device.get('DeviceInfo', {}).get('Label', '').startswith('Hard disk'):
+            if (json_field(device, 'DeviceInfo', 'Label') or '').startswith('Hard disk'):
                 disk_device = device
                 break
         
@@ -66,7 +65,7 @@ def test_disk_expansion(vm_name):
             logger.error("Could not find primary disk device")
             return
         
-        current_size_bytes = disk_device['CapacityInBytes']
+        current_size_bytes = json_field(disk_device, 'CapacityInBytes')
         current_size_gb = current_size_bytes // (1024**3)
         target_size_gb = int(config.vm_disk_size)
         
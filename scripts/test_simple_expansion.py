@@ -11,18 +11,17 @@ import subprocess
 # Add project root to path
 sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
 
-from modules.config import Config
-from modules.logger import Logger
+from modules.config import get_config
+from modules.logger import get_logger
+from modules.govc import get_govc_env, wait_power_off
 
 def test_expansion_methods(vm_name, target_size):
     """Test different disk expansion methods"""
-    config = Config()
-    logger = Logger()
+    config = get_config()
+    logger = get_logger()
     
-    # Set govc environment
-    env = os.environ.copy()
-    env['GOVC_URL'] = f"https://{config.esxi_user}:{config.esxi_password}@{config.esxi_host}/sdk"
-    env['GOVC_INSECURE'] = '1'
+    # Set govc environment - one login shared by every govc call
+    env = get_govc_env()
     
     logger.info(f"Testing disk expansion methods on: {vm_name}")
     logger.info(f"Target size: {target_size}GB")
@@ -32,8 +31,8 @@ def test_expansion_methods(vm_name, target_size):
     cmd = [config.govc_bin, 'vm.power', '-off', vm_name]
     subprocess.run(cmd, env=env, capture_output=True, text=True)
     
-    import time
-    time.sleep(5)
+    # Carry on as soon as ESXi reports it off, rather than a fixed 5s
+    wait_power_off(config, env, vm_name)
     
     try:
         # List devices first
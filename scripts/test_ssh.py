@@ -4,66 +4,59 @@ Test SSH connectivity with the new timeout settings
 """
 
 import sys
+import os
 import subprocess
-import time
+
+# Add project root to path
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from modules.ssh import parse_report, ssh_command
+
+# Remote script fed to 'bash -s': one ===TAG=== section per probe, each
+# followed by its exit code
+PROBE_SCRIPT = (
+    'echo "===READY==="; echo "SSH ready"; echo "RC=$?"\n'
+    'echo "===CI==="; sudo cloud-init status 2>/dev/null || echo "cloud-init not available"; echo "RC=$?"\n'
+    'echo "===INFO==="; uname -a 2>&1 && whoami 2>&1; echo "RC=$?"\n'
+)
 
 def test_ssh_connectivity(vm_ip):
     """Test SSH connection with same settings as monitor.py"""
     print(f"Testing SSH to {vm_ip}...")
     
     try:
-        # Test SSH connectivity with short timeout
-        ssh_test = subprocess.run([
-            'ssh', 
-            '-o', 'ConnectTimeout=3',
-            '-o', 'ConnectionAttempts=1',
-            '-o', 'StrictHostKeyChecking=no',
-            '-o', 'BatchMode=yes',
-            '-o', 'UserKnownHostsFile=/dev/null',
-            f'ubuntu@{vm_ip}', 'echo "SSH ready"'
-        ], capture_output=True, text=True, timeout=5)
+        # All three probes run in one remote shell, so the handshake and
+        # login are paid once
+        result = subprocess.run(ssh_command(vm_ip, 'bash -s', batch_mode=True), input=PROBE_SCRIPT,
+                                capture_output=True, text=True, timeout=15)
+        report = parse_report(result.stdout)
         
-        if ssh_test.returncode == 0:
+        if 'READY' in report:
             print("✅ SSH connection successful")
             
             # Test cloud-init status
             print("Testing cloud-init status...")
-            status_cmd = subprocess.run([
-                'ssh',
-                '-o', 'ConnectTimeout=3',
-                '-o', 'ConnectionAttempts=1', 
-                '-o', 'StrictHostKeyChecking=no',
-                '-o', 'UserKnownHostsFile=/dev/null',
-                f'ubuntu@{vm_ip}', 'sudo cloud-init status 2>/dev/null || echo "cloud-init not available"'
-            ], capture_output=True, text=True, timeout=10)
+            rc, status_output = report.get('CI', (1, ''))
             
-            if status_cmd.returncode == 0:
-                status_output = status_cmd.stdout.strip()
+            if rc == 0:
                 if "not available" in status_output:
                     print("ℹ️  Cloud-init not installed or not available")
                 else:
                     print(f"✅ Cloud-init status: {status_output}")
             else:
-                print(f"⚠️  Cloud-init status failed: {status_cmd.stderr.strip()}")
+                print(f"⚠️  Cloud-init status failed: {result.stderr.strip()}")
                 
             # Test basic system info
             print("Testing basic system access...")
-            info_cmd = subprocess.run([
-                'ssh',
-                '-o', 'ConnectTimeout=3',
-                '-o', 'ConnectionAttempts=1', 
-                '-o', 'StrictHostKeyChecking=no',
-                '-o', 'UserKnownHostsFile=/dev/null',
-                f'ubuntu@{vm_ip}', 'uname -a && whoami'
-            ], capture_output=True, text=True, timeout=10)
+            rc, info_output = report.get('INFO', (1, ''))
             
-            if info_cmd.returncode == 0:
-                print(f"✅ System info: {info_cmd.stdout.strip()}")
+            if rc == 0:
+                print(f"✅ System info: {info_output}")
             else:
-                print(f"⚠️  System info failed: {info_cmd.stderr.strip()}")
+                print(f"⚠️  System info failed: {info_output or result.stderr.strip()}")
                 
         else:
-            print(f"❌ SSH connection failed: {ssh_test.stderr.strip()}")
+            print(f"❌ SSH connection failed: {result.stderr.strip()}")
             
     except subprocess.TimeoutExpired:
         print("❌ SSH connection timed out")
@@ -8,6 +8,10 @@ import sys
 import os
 import subprocess
 import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from io import StringIO
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
 
 try:
     import yaml
@@ -56,8 +60,7 @@ def test_yaml_generation():
     
     try:
         # Import the module
-        sys.path.insert(0, '/Users/rwiggins/tools/newubuntu/modules')
-        from cloudinit import create_user_data_forced, create_meta_data, create_network_config
+        from modules.cloudinit import create_user_data_forced, create_meta_data, create_network_config
         
         # Create mock config
         class MockConfig:
@@ -145,8 +148,7 @@ def test_schema_validation():
     
     try:
         # Generate a test cloud-config
-        sys.path.insert(0, '/Users/rwiggins/tools/newubuntu/modules')
-        from cloudinit import create_user_data_forced
+        from modules.cloudinit import create_user_data_forced
         
         class MockConfig:
             def __init__(self):
@@ -277,6 +279,44 @@ def test_dependencies():
     
     return all_good
 
+class _ThreadOutput:
+    """sys.stdout stand-in that sends each thread's prints to its own buffer
+    
+    Threads without a buffer write straight through to the real stream.
+    """
+    
+    def __init__(self, stream):
+        self._stream = stream
+        self._local = threading.local()
+    
+    def start_buffer(self):
+        self._local.buffer = StringIO()
+    
+    def take_buffer(self):
+        buffer = self._local.__dict__.pop('buffer', None)
+        return buffer.getvalue() if buffer else ''
+    
+    def write(self, text):
+        return getattr(self._local, 'buffer', self._stream).write(text)
+    
+    def flush(self):
+        getattr(self._local, 'buffer', self._stream).flush()
+    
+    def __getattr__(self, name):
+        return getattr(self._stream, name)
+
+def _run_buffered(test_name, test_func):
+    """Run one test with its prints captured, returning (result, output)"""
+    sys.stdout.start_buffer()
+    try:
+        result = test_func()
+    except Exception as e:
+        print(f"❌ {test_name} test crashed: {e}")
+        result = False
+    finally:
+        output = sys.stdout.take_buffer()
+    return result, output
+
 def run_comprehensive_test():
     """Run all tests"""
     print("🚀 Cloud-Init Comprehensive Test Suite")
@@ -291,14 +331,22 @@ def run_comprehensive_test():
         ("Deployment Validation", test_deployment_if_available)
     ]
     
-    results = []
-    for test_name, test_func in tests:
-        try:
-            result = test_func()
-            results.append((test_name, result))
-        except Exception as e:
-            print(f"❌ {test_name} test crashed: {e}")
-            results.append((test_name, False))
+    # The tests are independent and mostly wait on subprocesses, so run them
+    # together; each one's output is held back and printed in suite order
+    real_stdout = sys.stdout
+    sys.stdout = _ThreadOutput(real_stdout)
+    try:
+        with ThreadPoolExecutor(max_workers=len(tests)) as executor:
+            futures = [executor.submit(_run_buffered, test_name, test_func) for test_name, test_func in tests]
+            
+            results = []
+            for (test_name, _), future in zip(tests, futures):
+                result, output = future.result()
+                real_stdout.write(output)
+                real_stdout.flush()
+                results.append((test_name, result))
+    finally:
+        sys.stdout = real_stdout
     
     # Print summary
     print("\n" + "=" * 50)
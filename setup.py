@@ -83,9 +83,10 @@ SSH_KEY_PATH={ssh_key_path}
     try:
         import subprocess
         import urllib.request
+        import yaml
         print("✅ Python modules: OK")
     except ImportError as e:
-        missing.append(f"Python module: {e}")
+        missing.append(f"Python module: {e} (install with: pip install PyYAML)")
     
     # Check system tools
     tools = ['wget', 'curl']